@@ -0,0 +1,75 @@
+import argparse
+import json
+import sys
+import backends
+import reports
+
+# Indices secundarios para los filtros y agrupaciones de los reportes y de los resumenes
+INDEX_DDL = [
+    # Filtros por nombre en los reportes (pais.nombre = 'Inglaterra', categoria.nombre = 'Deportes')
+    "CREATE INDEX idx_pais_nombre ON pais (nombre);",
+    "CREATE INDEX idx_categoria_nombre ON categoria (nombre);",
+    # Agrupaciones por fecha y por la columna generada con el mes
+    "CREATE INDEX idx_orden_fecha ON orden (fecha);",
+    "CREATE INDEX idx_orden_mes ON orden (mes);",
+    # Indices que cubren las agregaciones sobre detalle_orden sin leer la fila completa
+    "CREATE INDEX idx_detalle_producto_cantidad ON detalle_orden (producto_id, cantidad);",
+    "CREATE INDEX idx_detalle_orden_cubre ON detalle_orden (orden_id, producto_id, vendedor_id, cantidad, monto);",
+    # Rangos de fechas de las consultas 8 y 9 sobre las lineas, sin leer la fila completa
+    "CREATE INDEX idx_detalle_fecha_cubre ON detalle_orden (fecha, mes, orden_id, monto);",
+    # Ordenamientos de los reportes sobre las tablas de resumen
+    "CREATE INDEX idx_resumen_cliente_monto ON resumen_cliente (monto_total);",
+    "CREATE INDEX idx_resumen_producto_cantidad ON resumen_producto (cantidad_unidades);",
+    "CREATE INDEX idx_resumen_vendedor_monto ON resumen_vendedor (monto_total);",
+    "CREATE INDEX idx_resumen_pais_mes_mes ON resumen_pais_mes (mes);"
+]
+
+# Filas estimadas a partir de las que un recorrido completo se considera un problema
+DEFAULT_MAX_ROWS = 1000
+
+# Tipos de acceso de EXPLAIN que recorren toda la tabla o todo un indice
+FULL_SCAN_TYPES = ('ALL', 'index')
+
+# Ejecutar EXPLAIN sobre las consultas de cada reporte e indicar recorridos completos y filas examinadas
+def explain_reports(connection, max_rows=DEFAULT_MAX_ROWS):
+    # Las columnas de EXPLAIN (type, rows) son las de MySQL
+    if backends.dialect_of(connection) != backends.MYSQL:
+        raise ValueError("El analisis de planes solo esta disponible con MySQL")
+    result = {}
+    with connection.cursor() as cursor:
+        for name, queries in reports.REPORT_QUERIES.items():
+            plan = []
+            for query, params in queries:
+                cursor.execute("EXPLAIN " + query, params)
+                plan.extend(cursor.fetchall())
+            full_scans = [
+                {'tabla': row['table'], 'tipo': row['type'], 'filas': row['rows']}
+                for row in plan if row['type'] in FULL_SCAN_TYPES
+            ]
+            result[name] = {
+                'filas_examinadas': sum(row['rows'] or 0 for row in plan),
+                'recorridos_completos': full_scans,
+                'alerta': any((scan['filas'] or 0) >= max_rows for scan in full_scans),
+                'plan': plan
+            }
+    return result
+
+# Uso por linea de comandos: python Proyecto1/advisor.py [--max-filas N]
+# Termina con codigo 1 si algun reporte recorre completa una tabla grande.
+def main():
+    parser = argparse.ArgumentParser(description='Revisar el plan de ejecucion de cada consulta')
+    parser.add_argument('--max-filas', type=int, default=DEFAULT_MAX_ROWS)
+    args = parser.parse_args()
+    from app import create_connection
+    connection = create_connection()
+    try:
+        result = explain_reports(connection, args.max_filas)
+    finally:
+        connection.close()
+    for name, entry in result.items():
+        del entry['plan']
+    print(json.dumps(result, indent=4, default=str))
+    return 1 if any(entry['alerta'] for entry in result.values()) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
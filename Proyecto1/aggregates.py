@@ -0,0 +1,254 @@
+import time
+import uuid
+import backends
+
+# Tablas de resumen que se construyen despues de cargar el modelo. Los reportes leen de
+# estas tablas en lugar de recorrer detalle_orden en cada peticion. Cada fila guarda cuantas
+# lineas resume, para borrarla cuando se restan todas (una suma en cero no basta: hay precios en cero).
+SUMMARY_TABLES = [
+    'resumen_cliente',
+    'resumen_producto',
+    'resumen_vendedor',
+    'resumen_pais_mes',
+    'resumen_pais_categoria',
+    'resumen_control'
+]
+
+# Columna con el monto de cada linea (cantidad * precio), desnormalizada en detalle_orden
+LINE_AMOUNT_DDL = "monto DECIMAL (14, 2) NOT NULL DEFAULT 0"
+
+SUMMARY_DDL = [
+    """
+    CREATE TABLE resumen_cliente (
+        cliente_id INT NOT NULL PRIMARY KEY,
+        monto_total DECIMAL (16, 2) NOT NULL,
+        lineas BIGINT NOT NULL,
+        FOREIGN KEY (cliente_id) REFERENCES cliente(id)
+    );
+    """,
+    """
+    CREATE TABLE resumen_producto (
+        producto_id INT NOT NULL PRIMARY KEY,
+        cantidad_unidades BIGINT NOT NULL,
+        monto_vendido DECIMAL (16, 2) NOT NULL,
+        lineas BIGINT NOT NULL,
+        FOREIGN KEY (producto_id) REFERENCES producto(id)
+    );
+    """,
+    """
+    CREATE TABLE resumen_vendedor (
+        vendedor_id INT NOT NULL PRIMARY KEY,
+        monto_total DECIMAL (16, 2) NOT NULL,
+        lineas BIGINT NOT NULL,
+        FOREIGN KEY (vendedor_id) REFERENCES vendedor(id)
+    );
+    """,
+    """
+    CREATE TABLE resumen_pais_mes (
+        pais_id INT NOT NULL,
+        anio SMALLINT NOT NULL,
+        mes TINYINT NOT NULL,
+        monto_total DECIMAL (16, 2) NOT NULL,
+        lineas BIGINT NOT NULL,
+        PRIMARY KEY (pais_id, anio, mes),
+        FOREIGN KEY (pais_id) REFERENCES pais(id)
+    );
+    """,
+    """
+    CREATE TABLE resumen_pais_categoria (
+        pais_id INT NOT NULL,
+        categoria_id INT NOT NULL,
+        cantidad_unidades BIGINT NOT NULL,
+        monto_total DECIMAL (16, 2) NOT NULL,
+        lineas BIGINT NOT NULL,
+        PRIMARY KEY (pais_id, categoria_id),
+        FOREIGN KEY (pais_id) REFERENCES pais(id),
+        FOREIGN KEY (categoria_id) REFERENCES categoria(id)
+    );
+    """,
+    """
+    CREATE TABLE resumen_control (
+        id TINYINT NOT NULL PRIMARY KEY,
+        ultima_orden INT NOT NULL,
+        version_datos VARCHAR (32) NOT NULL DEFAULT ''
+    );
+    """
+]
+
+# Lineas de las ordenes en el rango (desde, hasta]
+RANGE_FILTER = "detalle_orden.orden_id > %s AND detalle_orden.orden_id <= %s"
+
+# Lineas de una lista de ordenes; {ids} son los marcadores de la lista
+ORDERS_FILTER = "detalle_orden.orden_id IN ({ids})"
+
+# Ordenes por cada sentencia con una lista de ids
+ID_BATCH = 1000
+
+# Calcular el monto de las lineas que cumplen {filtro}
+UPDATE_LINE_AMOUNT = """
+UPDATE detalle_orden
+JOIN producto ON detalle_orden.producto_id = producto.id
+SET detalle_orden.monto = detalle_orden.cantidad * producto.precio
+WHERE {filtro};
+"""
+
+# SQLite y DuckDB no tienen UPDATE ... JOIN, usan UPDATE ... FROM
+UPDATE_LINE_AMOUNT_FROM = """
+UPDATE detalle_orden
+SET monto = detalle_orden.cantidad * producto.precio
+FROM producto
+WHERE detalle_orden.producto_id = producto.id
+    AND {filtro};
+"""
+
+# Sumar a cada resumen las lineas que cumplen {filtro}: la consulta que las agrega, la llave
+# del resumen y las columnas que se suman. {anio} es la expresion del año de la orden en el
+# dialecto y {signo} es '-' para restar las lineas en lugar de sumarlas.
+ROLLUPS = [
+    ("""
+    INSERT INTO resumen_cliente (cliente_id, monto_total, lineas)
+    SELECT orden.cliente_id, {signo}SUM(detalle_orden.monto), {signo}COUNT(*)
+    FROM detalle_orden
+    JOIN orden ON detalle_orden.orden_id = orden.id
+    WHERE {filtro}
+    GROUP BY orden.cliente_id
+    """, ['cliente_id'], ['monto_total', 'lineas']),
+    ("""
+    INSERT INTO resumen_producto (producto_id, cantidad_unidades, monto_vendido, lineas)
+    SELECT detalle_orden.producto_id, {signo}SUM(detalle_orden.cantidad), {signo}SUM(detalle_orden.monto), {signo}COUNT(*)
+    FROM detalle_orden
+    WHERE {filtro}
+    GROUP BY detalle_orden.producto_id
+    """, ['producto_id'], ['cantidad_unidades', 'monto_vendido', 'lineas']),
+    ("""
+    INSERT INTO resumen_vendedor (vendedor_id, monto_total, lineas)
+    SELECT detalle_orden.vendedor_id, {signo}SUM(detalle_orden.monto), {signo}COUNT(*)
+    FROM detalle_orden
+    WHERE {filtro}
+    GROUP BY detalle_orden.vendedor_id
+    """, ['vendedor_id'], ['monto_total', 'lineas']),
+    ("""
+    INSERT INTO resumen_pais_mes (pais_id, anio, mes, monto_total, lineas)
+    SELECT cliente.pais_id, {anio}, orden.mes, {signo}SUM(detalle_orden.monto), {signo}COUNT(*)
+    FROM detalle_orden
+    JOIN orden ON detalle_orden.orden_id = orden.id
+    JOIN cliente ON orden.cliente_id = cliente.id
+    WHERE {filtro}
+    GROUP BY cliente.pais_id, {anio}, orden.mes
+    """, ['pais_id', 'anio', 'mes'], ['monto_total', 'lineas']),
+    ("""
+    INSERT INTO resumen_pais_categoria (pais_id, categoria_id, cantidad_unidades, monto_total, lineas)
+    SELECT cliente.pais_id, producto.categoria_id, {signo}SUM(detalle_orden.cantidad), {signo}SUM(detalle_orden.monto), {signo}COUNT(*)
+    FROM detalle_orden
+    JOIN orden ON detalle_orden.orden_id = orden.id
+    JOIN cliente ON orden.cliente_id = cliente.id
+    JOIN producto ON detalle_orden.producto_id = producto.id
+    WHERE {filtro}
+    GROUP BY cliente.pais_id, producto.categoria_id
+    """, ['pais_id', 'categoria_id'], ['cantidad_unidades', 'monto_total', 'lineas'])
+]
+
+# Sentencias de los resumenes en el dialecto de la conexion, para las lineas que cumplen
+# line_filter; con sign negativo restan las lineas
+def rollup_queries(dialect, line_filter=RANGE_FILTER, sign=1):
+    year = backends.year_sql('orden.fecha', dialect)
+    return [
+        query.format(anio=year, filtro=line_filter, signo='-' if sign < 0 else '').rstrip() + "\n    "
+        + backends.upsert_clause(dialect, keys, columns, additive=True) + ";"
+        for query, keys, columns in ROLLUPS
+    ]
+
+def update_line_amount(cursor, line_filter, params):
+    dialect = backends.dialect_of(cursor.connection)
+    query = UPDATE_LINE_AMOUNT if dialect == backends.MYSQL else UPDATE_LINE_AMOUNT_FROM
+    cursor.execute(query.format(filtro=line_filter), params)
+
+# Agregar las ordenes en el rango (desde, hasta] y mover la marca de agua
+def apply_range(cursor, since, until):
+    dialect = backends.dialect_of(cursor.connection)
+    update_line_amount(cursor, RANGE_FILTER, (since, until))
+    for query in rollup_queries(dialect):
+        cursor.execute(query, (since, until))
+    cursor.execute(
+        "INSERT INTO resumen_control (id, ultima_orden) VALUES (1, %s) " + backends.upsert_clause(dialect, ['id'], ['ultima_orden']) + ";",
+        (until,)
+    )
+
+# Sumar (sign 1) o restar (sign -1) en los resumenes las lineas de las ordenes indicadas, que ya
+# deben estar resumidas. Para cambiar ordenes o dimensiones se restan sus lineas antes del cambio
+# y se suman despues; al sumar se recalcula antes el monto de las lineas.
+def apply_orders(cursor, order_ids, sign):
+    dialect = backends.dialect_of(cursor.connection)
+    for start in range(0, len(order_ids), ID_BATCH):
+        batch = order_ids[start:start + ID_BATCH]
+        line_filter = ORDERS_FILTER.format(ids=', '.join(['%s'] * len(batch)))
+        if sign > 0:
+            update_line_amount(cursor, line_filter, batch)
+        for query in rollup_queries(dialect, line_filter, sign):
+            cursor.execute(query, batch)
+
+# Borrar las filas de resumen que ya no resumen ninguna linea
+def drop_empty_rows(cursor):
+    for table in SUMMARY_TABLES:
+        if table != 'resumen_control':
+            cursor.execute(f"DELETE FROM {table} WHERE lineas = 0;")
+
+# Ultima orden resumida (la marca de agua de los resumenes)
+def summarized_order(cursor, lock=False):
+    cursor.execute(f"SELECT ultima_orden FROM resumen_control WHERE id = 1{' FOR UPDATE' if lock else ''};")
+    row = cursor.fetchone()
+    return row['ultima_orden'] if row else 0
+
+# Version de los datos compartida por todos los procesos de la API: cada modificacion guarda
+# un valor nuevo al empezar y al terminar, y el cache de reportes de cada proceso la compara.
+# Vacia o sin fila (por ejemplo mientras refresh_aggregates reconstruye resumen_control) no se conoce.
+def data_version(cursor):
+    cursor.execute("SELECT version_datos FROM resumen_control WHERE id = 1;")
+    row = cursor.fetchone()
+    return (row['version_datos'] or None) if row else None
+
+# Guardar una version nueva y devolverla
+def publish_data_version(connection):
+    version = uuid.uuid4().hex
+    dialect = backends.dialect_of(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO resumen_control (id, ultima_orden, version_datos) VALUES (1, 0, %s) "
+            + backends.upsert_clause(dialect, ['id'], ['version_datos']) + ";",
+            (version,)
+        )
+    # Guardar cambios en la base de datos
+    connection.commit()
+    return version
+
+# Ultima orden cargada en el modelo
+def last_order(cursor):
+    cursor.execute("SELECT COALESCE(MAX(id), 0) AS ultima_orden FROM orden;")
+    return cursor.fetchone()['ultima_orden']
+
+# Reconstruir todos los resumenes desde cero
+def refresh_aggregates(connection):
+    start = time.perf_counter()
+    with connection.cursor() as cursor:
+        for table in SUMMARY_TABLES:
+            cursor.execute(f"DELETE FROM {table};")
+        until = last_order(cursor)
+        apply_range(cursor, 0, until)
+    # Guardar cambios en la base de datos
+    connection.commit()
+    return {'desde_orden': 0, 'hasta_orden': until, 'segundos': round(time.perf_counter() - start, 3)}
+
+# Agregar solo las ordenes nuevas, con id mayor a la ultima orden ya resumida. Los cambios en
+# ordenes ya resumidas se aplican con apply_orders.
+def refresh_aggregates_incremental(connection):
+    start = time.perf_counter()
+    with connection.cursor() as cursor:
+        # Bloquear la marca de agua para que dos actualizaciones no sumen las mismas ordenes.
+        # Los motores embebidos tienen un solo escritor a la vez y no usan FOR UPDATE.
+        since = summarized_order(cursor, lock=backends.dialect_of(connection) == backends.MYSQL)
+        until = last_order(cursor)
+        if until > since:
+            apply_range(cursor, since, until)
+    # Guardar cambios en la base de datos
+    connection.commit()
+    return {'desde_orden': since, 'hasta_orden': max(since, until), 'segundos': round(time.perf_counter() - start, 3)}
@@ -1,19 +1,246 @@
-from flask import Flask, jsonify
+from flask import Flask, g, jsonify, request, stream_with_context
+import functools
+import logging
+from contextlib import closing
 import pymysql
-import pandas
-from datetime import datetime
+import time
+import advisor
+import aggregates
+import approx
+import backends
+import columnar
+import delta
+import loader
+import metrics
+import reports
+import schema
+import settings
+import snapshot
+import staging
+from cache import ReportCache, SharedVersion
+from pool import ConnectionPool
 
 app = Flask(__name__)
 
-# Conexion a la base de datos en MySQL
-connection = pymysql.connect(
-    host='localhost',
-    user='root',
-    password='admin123',
-    database='empresa',
-    cursorclass=pymysql.cursors.DictCursor
+# Conexiones minimas y maximas del pool
+POOL_MIN_SIZE = 2
+POOL_MAX_SIZE = 10
+
+# Entradas maximas y segundos de vida del cache de reportes
+CACHE_MAX_ENTRIES = 256
+CACHE_TTL = 300
+
+# Segundos durante los que se reutiliza la version de los datos leida de la base de datos
+SHARED_VERSION_INTERVAL = 0.5
+
+# Motor de base de datos configurado en settings.BACKEND
+backends.check_backend(settings.BACKEND)
+
+# Abrir una conexion a la base de datos en MySQL. Con multi_statements se pueden enviar
+# varias sentencias en una sola llamada (solo para los scripts de esquema). Con un motor
+# embebido se abre su archivo y multi_statements no hace falta.
+def create_connection(multi_statements=False):
+    if settings.BACKEND != backends.MYSQL:
+        return backends.connect_embedded(settings.BACKEND, settings.EMBEDDED_PATH, metrics.InstrumentedEmbeddedCursor)
+    return pymysql.connect(
+        cursorclass=metrics.InstrumentedDictCursor,
+        local_infile=True,
+        client_flag=pymysql.constants.CLIENT.MULTI_STATEMENTS if multi_statements else 0,
+        **settings.DB_SETTINGS
+    )
+
+# Pool de conexiones a la base de datos en MySQL; cada peticion toma su propia conexion
+pool = ConnectionPool(
+    create_connection,
+    min_size=POOL_MIN_SIZE,
+    max_size=POOL_MAX_SIZE,
+    on_wait=metrics.pool_wait_seconds.observe
 )
 
+# Registro de sentencias lentas, activo si settings.SLOW_QUERY_SECONDS tiene un valor
+metrics.slow_queries.threshold = settings.SLOW_QUERY_SECONDS
+
+# Progreso de la carga en paralelo (filas y filas por segundo de cada tabla) en la salida
+# de errores del servidor; el nivel INFO deja verlo sin cambiar el del resto de la API
+load_logger = logging.getLogger('empresa.carga')
+if not load_logger.handlers:
+    load_handler = logging.StreamHandler()
+    load_handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+    load_logger.addHandler(load_handler)
+    load_logger.propagate = False
+load_logger.setLevel(logging.INFO)
+
+# Leer la version de los datos compartida entre los procesos de la API (guardada en
+# resumen_control), o None si no se conoce, por ejemplo sin el modelo creado
+def read_data_version():
+    try:
+        with pool.connection() as connection, connection.cursor() as cursor:
+            return aggregates.data_version(cursor)
+    except Exception:
+        return None
+
+# Version compartida vigente; se vuelve a leer como maximo cada SHARED_VERSION_INTERVAL
+data_version = SharedVersion(read_data_version, interval=SHARED_VERSION_INTERVAL)
+
+def shared_data_version():
+    return data_version.get()
+
+# Guardar una version nueva de los datos para que los demas procesos descarten su cache
+def publish_data_version():
+    try:
+        with pool.connection() as connection:
+            version = aggregates.publish_data_version(connection)
+    except Exception:
+        version = None
+    data_version.set(version)
+    return version
+
+# Cache de las respuestas de /consulta1 a /consulta10
+report_cache = ReportCache(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, shared_version=shared_data_version)
+
+# Motor de reportes en memoria, se elige por peticion con ?motor=memoria
+columnar_engine = columnar.ColumnarEngine()
+
+# Motor aproximado para los tableros (muestra y totales por dimension), se elige con ?approx=1
+approx_engine = columnar.ColumnarEngine()
+
+# Motores con los que se pueden calcular los reportes
+ENGINE_DATABASE = 'bd'
+ENGINE_MEMORY = 'memoria'
+ENGINES = (ENGINE_DATABASE, ENGINE_MEMORY)
+
+# Servir un reporte desde el cache, con ETag para responder 304 si el cliente ya lo tiene
+def cached_report(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.full_path
+        version = report_cache.current_version()
+        entry = report_cache.get(key, version)
+        status = 'HIT'
+        if entry is None:
+            status = 'MISS'
+            response = app.make_response(view(*args, **kwargs))
+            # Solo se guardan las respuestas correctas; las enviadas por partes no se guardan
+            if response.status_code != 200 or not response.is_json or response.is_streamed:
+                return response
+            entry = report_cache.put(key, version, response.get_data())
+        body, etag = entry
+        response = app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Cache'] = status
+        return response.make_conditional(request)
+    return wrapper
+
+# Formatos de respuesta de los reportes con varias filas. json arma la lista completa;
+# ndjson (una fila JSON por linea) y json_stream (lista JSON) se envian por partes.
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json_stream': 'application/json'
+}
+
+# Generar las filas de una consulta con un cursor del lado del servidor (SSDictCursor),
+# de modo que ni la base de datos ni la API guardan el resultado completo en memoria
+def generate_rows(query, params, response_format):
+    with pool.connection() as connection, connection.cursor(metrics.InstrumentedSSDictCursor) as cursor:
+        cursor.execute(query, params)
+        if response_format == 'ndjson':
+            for row in cursor:
+                yield app.json.dumps(row) + '\n'
+            return
+        yield '['
+        for index, row in enumerate(cursor):
+            yield (',' if index else '') + app.json.dumps(row)
+        yield ']'
+
+# Responder las filas de una consulta en el formato pedido con ?formato=
+def rows_response(query, params):
+    response_format = request.args.get('formato', default='json')
+    if response_format == 'json':
+        with pool.connection() as connection, connection.cursor() as cursor:
+            cursor.execute(query, params)
+            return jsonify(cursor.fetchall())
+    if response_format not in STREAM_FORMATS:
+        raise ValueError(f"Formato invalido: {response_format}")
+    rows = stream_with_context(generate_rows(query, params, response_format))
+    return app.response_class(rows, mimetype=STREAM_FORMATS[response_format])
+
+# Modelo en memoria vigente; si no hay uno se arma leyendo las tablas de la base de datos
+def columnar_model():
+    def build():
+        with pool.connection() as connection:
+            return columnar.ColumnarModel.from_connection(connection)
+    return columnar_engine.get(build, shared_data_version())
+
+# Modelo aproximado vigente; si no hay uno se arma con un modelo en memoria leido de la base
+# de datos, que no se instala: el modo aproximado solo guarda la muestra y los totales
+def approx_model():
+    def build():
+        with pool.connection() as connection:
+            return approx.ApproxModel(columnar.ColumnarModel.from_connection(connection))
+    return approx_engine.get(build, shared_data_version())
+
+# Ejecutar un reporte con los parametros de la URL. Los reportes que devuelven una lista
+# de filas aceptan ?formato= para enviarse por partes. Con ?motor=memoria se calculan
+# sobre el modelo en memoria sin consultar la base de datos. Con ?approx=1 se estiman con la
+# muestra, cada valor con su margen de error, o con los totales exactos por dimension.
+def report_response(name):
+    try:
+        if request.args.get('approx', default=0, type=int):
+            return jsonify(approx_model().run(name, request.args))
+        engine = request.args.get('motor', default=ENGINE_DATABASE)
+        if engine not in ENGINES:
+            raise ValueError(f"Motor invalido: {engine}")
+        if engine == ENGINE_MEMORY:
+            return jsonify(columnar_model().run(name, request.args))
+        query, params, shape = reports.report_plan(name, request.args)
+        if shape is None:
+            return rows_response(query, params)
+        with pool.connection() as connection, connection.cursor() as cursor:
+            cursor.execute(query, params)
+            result = reports.shape_rows(cursor.fetchall(), shape)
+    except Exception as e:
+        return f"Error: {str(e)}"
+    return jsonify(result)
+
+# Invalidar el cache antes y despues de modificar los datos, asi ningun reporte
+# calculado durante la modificacion queda guardado. El modelo en memoria se descarta
+# y se reemplaza por el que la vista deje en g.columnar_model, si deja uno; lo mismo con el
+# modelo aproximado y g.approx_model. La version compartida tambien cambia antes y despues,
+# para que los demas procesos dejen de usar su cache y sus modelos en memoria.
+def invalidates_cache(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        report_cache.invalidate()
+        publish_data_version()
+        columnar_engine.begin_update()
+        approx_engine.begin_update()
+        try:
+            return view(*args, **kwargs)
+        finally:
+            version = publish_data_version()
+            columnar_engine.end_update(g.pop('columnar_model', None), version)
+            approx_engine.end_update(g.pop('approx_model', None), version)
+            report_cache.invalidate()
+    return wrapper
+
+# Ruta de la peticion para las etiquetas de las metricas; las rutas inexistentes se agrupan
+def metrics_route():
+    return request.url_rule.rule if request.url_rule is not None else 'desconocida'
+
+# Atribuir las sentencias SQL de la peticion a su ruta y medir su duracion
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    metrics.operation.set(metrics_route())
+
+@app.after_request
+def finish_request_metrics(response):
+    if 'request_start' in g:
+        seconds = time.perf_counter() - g.request_start
+        metrics.request_seconds.observe(seconds, ruta=metrics_route(), estado=response.status_code)
+    return response
+
 # Definir una ruta para la pagina principal
 @app.route('/')
 def index():
@@ -21,545 +248,256 @@ def index():
 
 # Mostrar el cliente que mas ha comprado. Se debe de mostrar el id del cliente, nombre, apellido, pais y monto total.
 @app.route('/consulta1', methods=['GET'])
+@cached_report
 def get_query1():
-    try:
-        with connection.cursor() as cursor:
-            query = """
-            SELECT cliente.id AS id_cliente,
-                cliente.nombre AS nombre_cliente,
-                cliente.apellido AS apellido_cliente,
-                pais.nombre AS pais_cliente,
-                SUM(detalle_orden.cantidad * producto.precio) AS monto_total
-            FROM cliente
-            JOIN orden ON cliente.id = orden.cliente_id
-            JOIN detalle_orden ON orden.id = detalle_orden.orden_id
-            JOIN producto ON detalle_orden.producto_id = producto.id
-            JOIN pais ON cliente.pais_id = pais.id
-            GROUP BY cliente.id
-            ORDER BY monto_total DESC
-            LIMIT 1;
-            """
-            cursor.execute(query)
-            customer = cursor.fetchone()
-    except Exception as e:
-        return f"Error: {str(e)}"
-    finally:
-        cursor.close()
-    return jsonify(customer)
+    return report_response('consulta1')
 
 # Mostrar el producto mas y menos comprado. Se debe mostrar el id del producto, nombre del producto, categoria, cantidad de unidades y monto vendido.
 @app.route('/consulta2', methods=['GET'])
+@cached_report
 def get_query2():
-    try:
-        result = {}
-        with connection.cursor() as cursor:
-            # Buscar producto mas comprado
-            query = """
-            SELECT producto.id AS id_producto,
-                producto.nombre AS nombre_producto,
-                categoria.nombre AS categoria_producto,
-                SUM(detalle_orden.cantidad) AS cantidad_unidades,
-                SUM(detalle_orden.cantidad * producto.precio) AS monto_vendido
-            FROM producto
-            JOIN detalle_orden ON producto.id = detalle_orden.producto_id
-            JOIN categoria ON producto.categoria_id = categoria.id
-            GROUP BY producto.id
-            ORDER BY cantidad_unidades DESC
-            LIMIT 1;
-            """
-            cursor.execute(query)
-            product = cursor.fetchone()
-            result['producto_mas_comprado'] = product
-            # Buscar producto menos comprado
-            query = """
-            SELECT producto.id AS id_producto,
-                producto.nombre AS nombre_producto,
-                categoria.nombre AS categoria_producto,
-                SUM(detalle_orden.cantidad) AS cantidad_unidades,
-                SUM(detalle_orden.cantidad * producto.precio) AS monto_vendido
-            FROM producto
-            JOIN detalle_orden ON producto.id = detalle_orden.producto_id
-            JOIN categoria ON producto.categoria_id = categoria.id
-            GROUP BY producto.id
-            ORDER BY cantidad_unidades ASC
-            LIMIT 1;
-            """
-            cursor.execute(query)
-            product = cursor.fetchone()
-            result['producto_menos_comprado'] = product
-    except Exception as e:
-        return f"Error: {str(e)}"
-    finally:
-        cursor.close()
-    return jsonify(result)
+    return report_response('consulta2')
 
 # Mostrar a la persona que mas ha vendido. Se debe mostrar el id del vendedor, nombre del vendedor, monto total vendido.
 @app.route('/consulta3', methods=['GET'])
+@cached_report
 def get_query3():
-    try:
-        with connection.cursor() as cursor:
-            query = """
-            SELECT vendedor.id AS id_vendedor,
-                vendedor.nombre AS nombre_vendedor,
-                SUM(detalle_orden.cantidad * producto.precio) AS monto_total_vendido
-            FROM vendedor
-            JOIN detalle_orden ON vendedor.id = detalle_orden.vendedor_id
-            JOIN producto ON detalle_orden.producto_id = producto.id
-            GROUP BY vendedor.id
-            ORDER BY monto_total_vendido DESC
-            LIMIT 1;
-            """
-            cursor.execute(query)
-            seller = cursor.fetchone()
-    except Exception as e:
-        return f"Error: {str(e)}"
-    finally:
-        cursor.close()
-    return jsonify(seller)
+    return report_response('consulta3')
 
 # Mostrar el país que mas y menos ha vendido. Debe mostrar el nombre del pais y el monto. (Una sola consulta).
 @app.route('/consulta4', methods=['GET'])
+@cached_report
 def get_query4():
-    try:
-        with connection.cursor() as cursor:
-            query = """
-            SELECT * FROM (
-                SELECT pais.nombre AS nombre_pais,
-                SUM(detalle_orden.cantidad * producto.precio) AS monto_total_vendido
-                FROM detalle_orden
-                INNER JOIN vendedor ON detalle_orden.vendedor_id = vendedor.id
-                INNER JOIN pais ON vendedor.pais_id = pais.id
-                INNER JOIN producto ON detalle_orden.producto_id = producto.id
-                GROUP BY pais.nombre
-                ORDER BY monto_total_vendido DESC
-                LIMIT 1
-            ) AS max_total
-            UNION
-            SELECT * FROM (
-                SELECT pais.nombre AS nombre_pais,
-                SUM(detalle_orden.cantidad * producto.precio) AS monto_total_vendido
-                FROM detalle_orden
-                INNER JOIN vendedor ON detalle_orden.vendedor_id = vendedor.id
-                INNER JOIN pais ON vendedor.pais_id = pais.id
-                INNER JOIN producto ON detalle_orden.producto_id = producto.id
-                GROUP BY pais.nombre
-                ORDER BY monto_total_vendido ASC
-                LIMIT 1
-            ) AS min_total;
-            """
-            cursor.execute(query)
-            countries = cursor.fetchall()
-    except Exception as e:
-        return f"Error: {str(e)}"
-    finally:
-        cursor.close()
-    return jsonify(countries)
+    return report_response('consulta4')
 
 # Top 5 de paises que mas han comprado en orden ascendente. Se le solicita mostrar el id del pais, nombre y monto total.
 @app.route('/consulta5', methods=['GET'])
+@cached_report
 def get_query5():
-    try:
-        with connection.cursor() as cursor:
-            query = """
-            SELECT pais.id AS id_pais,
-                pais.nombre AS nombre_pais,
-                SUM(detalle_orden.cantidad * producto.precio) AS monto_total_comprado
-            FROM pais
-            JOIN cliente ON pais.id = cliente.pais_id
-            JOIN orden ON cliente.id = orden.cliente_id
-            JOIN detalle_orden ON orden.id = detalle_orden.orden_id
-            JOIN producto ON detalle_orden.producto_id = producto.id
-            GROUP BY pais.id
-            ORDER BY monto_total_comprado ASC
-            LIMIT 5;
-            """
-            cursor.execute(query)
-            countries = cursor.fetchall()
-    except Exception as e:
-        return f"Error: {str(e)}"
-    finally:
-        cursor.close()
-    return jsonify(countries)
+    return report_response('consulta5')
 
 # Mostrar la categoria que mas y menos se ha comprado. Debe de mostrar el nombre de la categoria y cantidad de unidades. (Una sola consulta).
 @app.route('/consulta6', methods=['GET'])
+@cached_report
 def get_query6():
-    try:
-        result = {}
-        with connection.cursor() as cursor:
-            # Buscar categoria que mas se ha comprado
-            query = """
-            SELECT * FROM (
-                SELECT categoria.nombre AS nombre_categoria, 
-                SUM(detalle_orden.cantidad) AS cantidad_total
-                FROM detalle_orden
-                INNER JOIN producto ON detalle_orden.producto_id = producto.id
-                INNER JOIN categoria ON producto.categoria_id = categoria.id
-                GROUP BY categoria.nombre
-                ORDER BY cantidad_total DESC
-                LIMIT 1
-            ) AS max_total
-            UNION
-            SELECT * FROM (
-                SELECT categoria.nombre AS nombre_categoria, 
-                SUM(detalle_orden.cantidad) AS cantidad_total
-                FROM detalle_orden
-                INNER JOIN producto ON detalle_orden.producto_id = producto.id
-                INNER JOIN categoria ON producto.categoria_id = categoria.id
-                GROUP BY categoria.nombre
-                ORDER BY cantidad_total ASC
-                LIMIT 1
-            ) AS min_total;
-            """
-            cursor.execute(query)
-            result['categoria_mas_comprada'] = cursor.fetchall()
-    except Exception as e:
-        return f"Error: {str(e)}"
-    finally:
-        cursor.close()
-    return jsonify(result)
+    return report_response('consulta6')
 
 # Mostrar la categoria mas comprada por cada país. Se debe de mostrar el nombre del pais, nombre de la categoria y cantidad de unidades.
 @app.route('/consulta7', methods=['GET'])
+@cached_report
 def get_query7():
-    try:
-        with connection.cursor() as cursor:
-            # Buscar la categoria mas comprada por cada pais
-            query = """
-            SELECT
-                resultado_pais.*
-            FROM
-                (SELECT
-                    pais.nombre AS pais,
-                    categoria.nombre AS categoría,
-                    SUM(detalle_orden.cantidad) AS cantidad_unidades
-                FROM detalle_orden
-                JOIN producto ON detalle_orden.producto_id = producto.id
-                JOIN categoria ON producto.categoria_id = categoria.id
-                JOIN orden ON detalle_orden.orden_id = orden.id
-                JOIN cliente ON orden.cliente_id = cliente.id
-                JOIN pais ON cliente.pais_id = pais.id
-                GROUP BY pais.nombre, categoria.nombre
-                ORDER BY pais.nombre, cantidad_unidades DESC) AS resultado_pais
-            GROUP BY resultado_pais.pais
-            ORDER BY resultado_pais.pais;
-            """
-            cursor.execute(query)
-            categories = cursor.fetchall()
-    except Exception as e:
-        return f"Error: {str(e)}"
-    finally:
-        cursor.close()
-    return jsonify(categories)
+    return report_response('consulta7')
 
 # Mostrar las ventas por mes de Inglaterra. Debe de mostrar el numero del mes y el monto.
+# Acepta ?pais=, ?desde= y ?hasta= para otros paises y rangos de fechas.
 @app.route('/consulta8', methods=['GET'])
+@cached_report
 def get_query8():
-    try:
-        with connection.cursor() as cursor:
-            query = """
-            SELECT MONTH(orden.fecha) AS numero_mes,
-            SUM(detalle_orden.cantidad * producto.precio) AS monto_total
-            FROM detalle_orden
-            JOIN orden ON detalle_orden.orden_id = orden.id
-            JOIN cliente ON orden.cliente_id = cliente.id
-            JOIN pais ON cliente.pais_id = pais.id
-            JOIN producto ON detalle_orden.producto_id = producto.id
-            WHERE pais.nombre = 'Inglaterra'
-            GROUP BY MONTH(orden.fecha)
-            ORDER BY numero_mes;
-            """
-            cursor.execute(query)
-            sales = cursor.fetchall()
-    except Exception as e:
-        return f"Error: {str(e)}"
-    finally:
-        cursor.close()
-    return jsonify(sales)
+    return report_response('consulta8')
 
 # Mostrar el mes con mas y menos ventas. Se debe de mostrar el numero de mes y monto. (Una sola consulta).
 @app.route('/consulta9', methods=['GET'])
+@cached_report
 def get_query9():
-    try:
-        with connection.cursor() as cursor:
-            query = """
-            SELECT mes, monto FROM (
-            SELECT 
-            MONTH(orden.fecha) AS mes,
-            SUM(detalle_orden.cantidad * producto.precio) AS monto
-            FROM orden
-            INNER JOIN detalle_orden ON orden.id = detalle_orden.orden_id
-            INNER JOIN producto ON detalle_orden.producto_id = producto.id
-            GROUP BY MONTH(orden.fecha)
-            ORDER BY monto DESC
-            LIMIT 1
-            ) AS maximo_venta
-            UNION
-            SELECT mes, monto FROM ( 
-            SELECT 
-            MONTH(orden.fecha) AS mes,
-            SUM(detalle_orden.cantidad * producto.precio) AS monto
-            FROM orden 
-            INNER JOIN detalle_orden ON orden.id = detalle_orden.orden_id
-            INNER JOIN producto ON detalle_orden.producto_id = producto.id
-            GROUP BY MONTH(orden.fecha)
-            ORDER BY monto ASC
-            LIMIT 1
-            ) AS minimo_venta;
-            """
-            cursor.execute(query)
-            months = cursor.fetchall()
-    except Exception as e:
-        return f"Error: {str(e)}"
-    finally:
-        cursor.close()
-    return jsonify(months)
+    return report_response('consulta9')
 
 # Mostrar las ventas de cada producto de la categoria deportes. Se debe de mostrar el id del producto, nombre y monto.
 @app.route('/consulta10', methods=['GET'])
+@cached_report
 def get_query10():
-    try:
-        with connection.cursor() as cursor:
-            query = """
-            SELECT producto.id AS id_producto,
-                producto.nombre AS nombre_producto,
-                SUM(detalle_orden.cantidad * producto.precio) AS monto_total
-            FROM producto
-            JOIN categoria ON producto.categoria_id = categoria.id
-            JOIN detalle_orden ON producto.id = detalle_orden.producto_id
-            WHERE categoria.nombre = 'Deportes'
-            GROUP BY producto.id, producto.nombre;
-            """
-            cursor.execute(query)
-            sales = cursor.fetchall()
-    except Exception as e:
-        return f"Error: {str(e)}"
-    finally:
-        cursor.close()
-    return jsonify(sales)
+    return report_response('consulta10')
 
-# Eliminar las tablas de la base de datos
+# Eliminar las tablas de la base de datos, en un solo viaje al servidor
 @app.route('/eliminarmodelo', methods=['GET'])
+@invalidates_cache
 def get_delete_model():
     try:
-        with connection.cursor() as cursor:
-            queries = [
-                "DROP TABLE detalle_orden;",
-                "DROP TABLE orden;",
-                "DROP TABLE cliente;",
-                "DROP TABLE vendedor;",
-                "DROP TABLE pais;",
-                "DROP TABLE producto;",
-                "DROP TABLE categoria;"
-            ]
-            for query in queries:
-                cursor.execute(query)
-            connection.commit()
+        with closing(create_connection(multi_statements=True)) as connection:
+            schema.run_script(connection, schema.drop_model_ddl(settings.BACKEND))
     except Exception as e:
         return f"Error: {str(e)}"
-    finally:
-        cursor.close()
     return jsonify({'message': 'Modelo eliminado correctamente'})
 
-# Crear tablas del modelo
+# Crear tablas del modelo, en un solo viaje al servidor. Con ?diferir=1 las llaves foraneas y
+# los indices secundarios se crean y validan al terminar /cargarmodelo, fuera de la carga.
+# Con ?particionar=1 detalle_orden se particiona por año de fecha (solo MySQL), de modo que
+# las consultas 8 y 9 con ?desde= y ?hasta= leen solo las particiones del rango.
 @app.route('/crearmodelo', methods=['GET'])
+@invalidates_cache
 def get_create_model():
     try:
-        with connection.cursor() as cursor:
-            queries = [
-                """DROP DATABASE IF EXISTS empresa;""",
-                """CREATE DATABASE empresa;""",
-                """USE empresa;""",
-                """
-                CREATE TABLE categoria (
-                    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
-                    nombre VARCHAR (255) NOT NULL
-                );
-                """,   
-                """
-                CREATE TABLE producto (
-                    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
-                    nombre VARCHAR (255) NOT NULL,
-                    precio DECIMAL (10, 2) NOT NULL,
-                    categoria_id INT NOT NULL,
-                    FOREIGN KEY (categoria_id) REFERENCES categoria(id)
-                );
-                """,
-                """
-                CREATE TABLE pais (
-                    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
-                    nombre VARCHAR (255) NOT NULL
-                );
-                """,
-                """
-                CREATE TABLE cliente (
-                    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
-                    nombre VARCHAR (255) NOT NULL,
-                    apellido VARCHAR (255) NOT NULL,
-                    direccion VARCHAR (255) NOT NULL,
-                    telefono VARCHAR (255) NOT NULL,
-                    tarjeta_credito VARCHAR (255) NOT NULL,
-                    edad INT NOT NULL,
-                    salario DECIMAL (10,2) NOT NULL,
-                    genero VARCHAR (255) NOT NULL,
-                    pais_id INT NOT NULL,
-                    FOREIGN KEY (pais_id) REFERENCES pais(id)
-                );
-                """,
-                """
-                CREATE TABLE vendedor (
-                    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
-                    nombre VARCHAR (255) NOT NULL,
-                    pais_id INT NOT NULL,
-                    FOREIGN KEY (pais_id) REFERENCES pais(id)
-                );
-                """,
-                """
-                CREATE TABLE orden (
-                    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
-                    fecha DATE NOT NULL,
-                    cliente_id INT NOT NULL,
-                    FOREIGN KEY (cliente_id) REFERENCES cliente(id)
-                );
-                """,
-                """
-                CREATE TABLE detalle_orden (
-                    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
-                    linea_orden INT NOT NULL,
-                    cantidad INT NOT NULL,
-                    producto_id INT NOT NULL,
-                    vendedor_id INT NOT NULL,
-                    orden_id INT NOT NULL,
-                    FOREIGN KEY (producto_id) REFERENCES producto(id),
-                    FOREIGN KEY (vendedor_id) REFERENCES vendedor(id),
-                    FOREIGN KEY (orden_id) REFERENCES orden(id)
-                );
-                """
-            ]
-            for query in queries:
-                cursor.execute(query)
-            connection.commit()
+        defer = request.args.get('diferir', default=0, type=int)
+        partition = request.args.get('particionar', default=0, type=int)
+        statements = schema.create_model_ddl(defer, settings.BACKEND, partition, settings.DB_SETTINGS['database'])
+        with closing(create_connection(multi_statements=True)) as connection:
+            schema.run_script(connection, statements)
     except Exception as e:
         return f"Error: {str(e)}"
-    finally:
-        cursor.close()
     return jsonify({'message': 'Modelo creado correctamente'})
 
-# Eliminar información de tablas
+# Eliminar información de tablas. Por defecto se vacian con TRUNCATE; con ?modo=delete se
+# borran fila por fila dentro de una transaccion.
 @app.route('/borrarinfodb', methods=['GET'])
+@invalidates_cache
 def get_delete_info():
     try:
-        with connection.cursor() as cursor:
-            queries = [
-                "DELETE FROM detalle_orden;",
-                "DELETE FROM orden;",
-                "DELETE FROM cliente;",
-                "DELETE FROM vendedor;",
-                "DELETE FROM pais;",
-                "DELETE FROM producto;",
-                "DELETE FROM categoria;"
-            ]            
-            for query in queries:
-                cursor.execute(query)
-            connection.commit()
+        if request.args.get('modo', default='truncate') == 'delete':
+            with pool.connection() as connection, connection.cursor() as cursor:
+                queries = [f"DELETE FROM {table};" for table in aggregates.SUMMARY_TABLES] + [
+                    f"DELETE FROM {table};" for table in reversed(schema.MODEL_TABLES)
+                ]
+                for query in queries:
+                    cursor.execute(query)
+                connection.commit()
+        else:
+            with closing(create_connection(multi_statements=True)) as connection:
+                schema.run_script(connection, schema.truncate_model_ddl(settings.BACKEND))
     except Exception as e:
         return f"Error: {str(e)}"
-    finally:
-        cursor.close()
     return jsonify({'message': 'Informacion eliminada correctamente'})
 
 # Cargar datos a modelo
 @app.route('/cargarmodelo', methods=['GET'])
+@invalidates_cache
 def get_load_model():
     try:
-        # Cargar categorias en la base de datos
-        df_categories = pandas.read_csv('Proyecto1/archivos/Categorias.csv', delimiter=';')
-        with connection.cursor() as cursor:
-            for index, row in df_categories.iterrows():
-                id_category = row['id_categoria']
-                name = row['nombre']
-                sql = "INSERT INTO categoria (id, nombre) VALUES (%s, %s)"
-                cursor.execute(sql, (id_category, name))
-            # Guardar cambios en la base de datos
-            connection.commit()
-        # Cargar productos en la base de datos
-        df_products = pandas.read_csv('Proyecto1/archivos/productos.csv', delimiter=';')
-        with connection.cursor() as cursor:
-            for index, row in df_products.iterrows():
-                id_product = row['id_producto']
-                name = row['Nombre']
-                price = float(row['Precio'])
-                id_category = row['id_categoria']
-                sql = "INSERT INTO producto (id, nombre, precio, categoria_id) VALUES (%s, %s, %s, %s)"
-                cursor.execute(sql, (id_product, name, price, id_category))
-            # Guardar cambios en la base de datos
-            connection.commit()
-        # Cargar paises en la base de datos
-        df_countries = pandas.read_csv('Proyecto1/archivos/paises.csv', delimiter=';')
-        with connection.cursor() as cursor:
-            for index, row in df_countries.iterrows():
-                id_country = row['id_pais']
-                name = row['nombre']
-                sql = "INSERT INTO pais (id, nombre) VALUES (%s, %s)"
-                cursor.execute(sql, (id_country, name))
-            # Guardar cambios en la base de datos
-            connection.commit()
-        # Cargar clientes en la base de datos
-        df_customers = pandas.read_csv('Proyecto1/archivos/clientes.csv', delimiter=';')
-        with connection.cursor() as cursor:
-            for index, row in df_customers.iterrows():
-                id_customer = row['id_cliente']
-                name = row['Nombre']
-                lastname = row['Apellido']
-                address = row['Direccion']
-                phone = row['Telefono']
-                card = row['Tarjeta']
-                age = row['Edad']
-                salary = float(row['Salario'])
-                gender = row['Genero']
-                id_country = row['id_pais']
-                sql = "INSERT INTO cliente (id, nombre, apellido, direccion, telefono, tarjeta_credito, edad, salario, genero, pais_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
-                cursor.execute(sql, (id_customer, name, lastname, address, phone, card, age, salary, gender, id_country))
-            # Guardar cambios en la base de datos
-            connection.commit()
-        # Cargar vendedores en la base de datos         
-        df_sellers = pandas.read_csv('Proyecto1/archivos/vendedores.csv', delimiter=';')
-        with connection.cursor() as cursor:
-            for index, row in df_sellers.iterrows():
-                id_seller = row['id_vendedor']
-                name = row['nombre']
-                id_country = row['id_pais']
-                sql = "INSERT INTO vendedor (id, nombre, pais_id) VALUES (%s, %s, %s)"
-                cursor.execute(sql, (id_seller, name, id_country))
-            # Guardar cambios en la base de datos
-            connection.commit()
-        # Cargar ordenes en la base de datos
-        id_order_current = 0
-        df_orders = pandas.read_csv('Proyecto1/archivos/ordenes.csv', delimiter=';')
-        with connection.cursor() as cursor:
-            for index, row in df_orders.iterrows():
-                if id_order_current != row['id_orden']:
-                    id_order_current = row['id_orden'] # Actualizar el id de la orden
-                    date = row['fecha_orden']
-                    date_datetime = datetime.strptime(date, "%d/%m/%Y")
-                    date_converted = date_datetime.strftime("%Y-%m-%d")
-                    id_customer = row['id_cliente']
-                    sql = "INSERT INTO orden (id, fecha, cliente_id) VALUES (%s, %s, %s)"
-                    cursor.execute(sql, (id_order_current, date_converted, id_customer))
-                line = row['linea_orden']
-                amount = row['cantidad']
-                id_product = row['id_producto']
-                id_seller = row['id_vendedor']
-                id_order = row['id_orden']
-                sql = "INSERT INTO detalle_orden (id, linea_orden, cantidad, producto_id, vendedor_id, orden_id) VALUES (%s, %s, %s, %s, %s, %s)"
-                cursor.execute(sql, (index+1, line, amount, id_product, id_seller, id_order))
-            # Guardar cambios en la base de datos
-            connection.commit()
-        return jsonify({'message': 'Modelo cargado correctamente'})
+        # Tamano de lote y modo de carga (lotes o infile) configurables por parametro
+        chunk_size = request.args.get('lote', default=loader.DEFAULT_CHUNK_SIZE, type=int)
+        mode = request.args.get('modo', default=loader.MODE_BATCH)
+        # Filas por bloque al leer los CSV; si se indica, la carga se hace en streaming
+        chunk_rows = request.args.get('bloque', default=None, type=int)
+        # Hilos para cargar en paralelo, cada uno con su propia conexion
+        workers = request.args.get('hilos', default=None, type=int)
+        # Instantanea de la que se carga el modelo en lugar de los CSV
+        snapshot_name = request.args.get('instantanea', default=None)
+        # Con ?validar=1 los CSV pasan antes por staging: las filas con errores van a los
+        # archivos de rechazos y solo se cargan las limpias. ?procesos= fija el pool de parseo.
+        validate = request.args.get('validar', default=0, type=int)
+        processes = request.args.get('procesos', default=staging.DEFAULT_PROCESSES, type=int)
+        validation = None
+        start = time.perf_counter()
+        # Los bloques insertados tambien arman el modelo en memoria, salvo en streaming: ahi se
+        # guardarian todos los bloques hasta el final. Sin builder el modelo en memoria se arma
+        # desde la base de datos la primera vez que se pide.
+        builder = columnar.ColumnarBuilder() if chunk_rows is None else None
+        on_insert = builder.append if builder is not None else None
+        # Cada fase de la carga queda medida en /metrics
+        if validate and snapshot_name is None:
+            with metrics.load_phase('validacion'):
+                staged_tables, validation = staging.stage_model(processes=processes)
+        with metrics.load_phase('tablas'):
+            if snapshot_name is not None:
+                snapshot_tables = snapshot.load_snapshot(snapshot_name)
+                with pool.connection() as connection:
+                    tables = loader.load_tables(connection, snapshot_tables, chunk_size, mode, chunk_rows)
+            elif validation is not None and workers is None:
+                with pool.connection() as connection:
+                    tables = loader.load_tables(connection, staged_tables, chunk_size, mode, chunk_rows, on_insert)
+            elif validation is not None:
+                tables = loader.load_model_parallel(create_connection, workers, chunk_size, mode, chunk_rows, on_insert, staged_tables)
+            elif workers is None:
+                with pool.connection() as connection:
+                    tables = loader.load_model(connection, chunk_size, mode, chunk_rows, on_insert)
+            else:
+                tables = loader.load_model_parallel(create_connection, workers, chunk_size, mode, chunk_rows, on_insert)
+        metrics.observe_load(tables)
+        with pool.connection() as connection:
+            # Construir las tablas de resumen que usan los reportes
+            with metrics.load_phase('resumenes'):
+                summary = aggregates.refresh_aggregates(connection)
+            # Crear y validar las llaves foraneas e indices diferidos por /crearmodelo?diferir=1
+            with metrics.load_phase('restricciones'):
+                constraints = schema.finish_model(connection)
+        if snapshot_name is not None or builder is not None:
+            with metrics.load_phase('memoria'):
+                if snapshot_name is not None:
+                    # El modelo en memoria usa directamente los arreglos de la instantanea
+                    g.columnar_model = columnar.ColumnarModel(snapshot_tables)
+                else:
+                    g.columnar_model = builder.build()
+            # La muestra y los totales del modo aproximado se arman con la carga
+            with metrics.load_phase('muestra'):
+                g.approx_model = approx.ApproxModel(g.columnar_model)
+        total_seconds = round(time.perf_counter() - start, 3)
+        result = {'message': 'Modelo cargado correctamente', 'tablas': tables, 'resumenes': summary, 'restricciones': constraints, 'segundos_totales': total_seconds}
+        if validation is not None:
+            result['validacion'] = validation
+        return jsonify(result)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+# Cargar solo los datos nuevos o modificados y actualizar los resumenes. Los CSV se envian
+# por POST (multipart, un archivo por tabla con su nombre original, p. ej. ordenes.csv)
+# o se leen de la carpeta indicada con ?carpeta=
+@app.route('/cargarincremental', methods=['GET', 'POST'])
+@invalidates_cache
+def get_load_delta():
+    try:
+        chunk_size = request.args.get('lote', default=loader.DEFAULT_CHUNK_SIZE, type=int)
+        if request.files:
+            sources = {uploaded.filename or field: uploaded.stream for field, uploaded in request.files.items()}
+        else:
+            folder = request.args.get('carpeta')
+            if not folder:
+                raise ValueError("Se deben enviar los archivos o indicar ?carpeta=")
+            sources = delta.folder_sources(folder)
+        frames = delta.read_delta(sources)
+        with pool.connection() as connection:
+            result = delta.load_delta(connection, frames, chunk_size)
     except Exception as e:
-        print(f"Error: {str(e)}")
-    finally:
-        connection.close()
+        return f"Error: {str(e)}"
+    return jsonify({'message': 'Carga incremental realizada correctamente', **result})
+
+# Guardar las tablas del modelo como instantanea binaria, para recargarlas despues
+# con /cargarmodelo?instantanea=nombre sin volver a leer los CSV
+@app.route('/exportarinstantanea', methods=['GET'])
+def get_export_snapshot():
+    try:
+        name = request.args.get('nombre', default=snapshot.DEFAULT_SNAPSHOT)
+        start = time.perf_counter()
+        with pool.connection() as connection:
+            tables = snapshot.tables_from_connection(connection)
+        manifest = snapshot.export_snapshot(tables, name)
+        seconds = round(time.perf_counter() - start, 3)
+    except Exception as e:
+        return f"Error: {str(e)}"
+    return jsonify({'message': 'Instantanea exportada correctamente', 'instantanea': manifest, 'segundos': seconds})
+
+# Actualizar las tablas de resumen con las ordenes agregadas despues de la ultima actualizacion.
+# Con ?completo=1 se reconstruyen desde cero.
+@app.route('/actualizarresumen', methods=['GET'])
+@invalidates_cache
+def get_refresh_summary():
+    try:
+        with pool.connection() as connection:
+            if request.args.get('completo', default=0, type=int):
+                summary = aggregates.refresh_aggregates(connection)
+            else:
+                summary = aggregates.refresh_aggregates_incremental(connection)
+    except Exception as e:
+        return f"Error: {str(e)}"
+    return jsonify({'message': 'Resumenes actualizados correctamente', 'resumenes': summary})
+
+# Revisar con EXPLAIN el plan de cada consulta e indicar recorridos completos de tablas grandes
+@app.route('/explicar', methods=['GET'])
+def get_explain():
+    try:
+        max_rows = request.args.get('max_filas', default=advisor.DEFAULT_MAX_ROWS, type=int)
+        with pool.connection() as connection:
+            result = advisor.explain_reports(connection, max_rows)
+    except Exception as e:
+        return f"Error: {str(e)}"
+    return jsonify(result)
+
+# Metricas en formato de texto de Prometheus
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return app.response_class(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+# Ultimas sentencias que superaron el umbral de settings.SLOW_QUERY_SECONDS, con su EXPLAIN
+@app.route('/consultaslentas', methods=['GET'])
+def get_slow_queries():
+    return jsonify({'umbral_segundos': metrics.slow_queries.threshold, 'consultas': metrics.slow_queries.recent()})
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
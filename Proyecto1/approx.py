@@ -0,0 +1,250 @@
+import numpy
+import reports
+from columnar import ColumnarModel, extremes, money, name_ranks
+
+# Motor aproximado para los tableros: responde los diez reportes con una muestra estratificada
+# de detalle_orden y con totales por dimension, sin recorrer todas las lineas.
+# - Los reportes por pais, categoria y mes (4 a 9) se estiman con la muestra, estratificada
+#   por pais del cliente y mes. Cada valor estimado va acompañado de su margen de error (campo
+#   <nombre>_margen), el intervalo de confianza del 95%.
+# - Los reportes por cliente, producto y vendedor (1, 2, 3 y 10) buscan extremos o valores por
+#   llave, que una muestra no estima bien. Se responden con los totales exactos por cliente,
+#   producto y vendedor, que ocupan un valor por fila de la dimension (menos que un sketch de
+#   count-min con un error util), y se marcan como exactos.
+# Se arma a partir del modelo en memoria cada vez que se cargan los datos; solo guarda las
+# dimensiones, los totales y la muestra.
+
+# Fraccion de las lineas que entra en la muestra y minimo de lineas por estrato
+SAMPLE_FRACTION = 0.02
+MIN_STRATUM_ROWS = 30
+
+# Nivel de confianza de los margenes de la muestra y su valor z
+CONFIDENCE = 0.95
+Z_SCORE = 1.96
+
+# Reportes que se responden con totales exactos
+EXACT_REPORTS = ('consulta1', 'consulta2', 'consulta3', 'consulta10')
+
+# Semilla fija: la misma carga da siempre la misma muestra y las mismas respuestas
+SEED = 0
+
+class ApproxModel:
+    def __init__(self, model):
+        # Solo se guardan las dimensiones; los arreglos de hechos quedan en la muestra y los totales
+        self.categories = model.categories
+        self.products = model.products
+        self.countries = model.countries
+        self.customers = model.customers
+        self.sellers = model.sellers
+        self.product_category = model.product_category
+        self.customer_country_of = model.customer_country_of
+        self.rows = model.rows
+        self.dimension_totals(model)
+        self.sample_lines(model)
+
+    # Totales exactos por cliente, vendedor y producto, y que filas tienen ventas
+    def dimension_totals(self, model):
+        self.customer_amounts = model.totals(model.customer, model.customers.size, model.amount)
+        self.customers_sold = model.totals(model.customer, model.customers.size) > 0
+        self.seller_amounts = model.totals(model.seller, model.sellers.size, model.amount)
+        self.sellers_sold = model.totals(model.seller, model.sellers.size) > 0
+        self.product_units = model.totals(model.product, model.products.size, model.quantity)
+        self.product_amounts = model.totals(model.product, model.products.size, model.amount)
+        self.products_sold = model.totals(model.product, model.products.size) > 0
+
+    # Muestra estratificada: de cada estrato (pais del cliente y mes) se toma SAMPLE_FRACTION de
+    # sus lineas, al menos MIN_STRATUM_ROWS, elegidas al azar
+    def sample_lines(self, model):
+        strata = model.customer_country.astype(numpy.int64) * 12 + model.month - 1
+        _, strata = numpy.unique(strata, return_inverse=True)
+        self.population = numpy.bincount(strata).astype(numpy.float64)
+        wanted = numpy.minimum(self.population, numpy.maximum(MIN_STRATUM_ROWS, numpy.ceil(self.population * SAMPLE_FRACTION)))
+        # Posicion de cada linea dentro de su estrato, en un orden aleatorio
+        order = numpy.lexsort((numpy.random.default_rng(SEED).random(self.rows), strata))
+        starts = numpy.concatenate(([0], numpy.cumsum(self.population)[:-1])).astype(numpy.int64)
+        position = numpy.empty(self.rows, dtype=numpy.int64)
+        position[order] = numpy.arange(self.rows) - starts[strata[order]]
+        lines = numpy.flatnonzero(position < wanted[strata])
+        self.sampled = numpy.bincount(strata[lines], minlength=len(self.population)).astype(numpy.float64)
+        self.stratum = strata[lines]
+        self.customer_country = model.customer_country[lines]
+        self.seller_country = model.seller_country[lines]
+        self.category = model.category[lines]
+        self.date = model.date[lines]
+        self.month = model.month[lines]
+        self.quantity = model.quantity[lines]
+        self.amount = model.amount[lines]
+
+    # Total estimado de values por grupo y margen del intervalo de confianza. Las lineas fuera
+    # de mask cuentan con valor cero, asi el estimador sigue usando todas las lineas del estrato.
+    def estimate(self, groups, size, values, mask=None):
+        values = values.astype(numpy.float64)
+        if mask is not None:
+            values = numpy.where(mask, values, 0)
+        strata = len(self.population)
+        cells = self.stratum.astype(numpy.int64) * size + groups
+        sums = numpy.bincount(cells, weights=values, minlength=strata * size).reshape(strata, size)
+        squares = numpy.bincount(cells, weights=values * values, minlength=strata * size).reshape(strata, size)
+        population = self.population[:, None]
+        sampled = self.sampled[:, None]
+        totals = (population / sampled * sums).sum(axis=0)
+        deviation = (squares - sums * sums / sampled) / numpy.maximum(sampled - 1, 1)
+        variance = (population * population * (1 - sampled / population) * numpy.maximum(deviation, 0) / sampled).sum(axis=0)
+        present = numpy.bincount(groups if mask is None else groups[mask], minlength=size) > 0
+        return numpy.rint(totals).astype(numpy.int64), numpy.ceil(Z_SCORE * numpy.sqrt(variance)).astype(numpy.int64), present
+
+    def run(self, name, args):
+        exact = name in EXACT_REPORTS
+        return {
+            'resultado': getattr(self, 'query' + name[len('consulta'):])(args),
+            'exacto': exact,
+            'confianza': None if exact else CONFIDENCE,
+            'filas_muestra': len(self.stratum),
+            'filas_total': self.rows
+        }
+
+    def query1(self, args):
+        best, _ = extremes(self.customer_amounts, numpy.arange(self.customers.size), self.customers_sold)
+        if best is None:
+            return None
+        return {
+            'id_cliente': int(self.customers['id'][best]),
+            'nombre_cliente': self.customers['nombre'][best],
+            'apellido_cliente': self.customers['apellido'][best],
+            'pais_cliente': self.countries['nombre'][self.customer_country_of[best]],
+            'monto_total': money(self.customer_amounts[best])
+        }
+
+    def product_row(self, code):
+        return {
+            'id_producto': int(self.products['id'][code]),
+            'nombre_producto': self.products['nombre'][code],
+            'categoria_producto': self.categories['nombre'][self.product_category[code]],
+            'cantidad_unidades': int(self.product_units[code]),
+            'monto_vendido': money(self.product_amounts[code])
+        }
+
+    def query2(self, args):
+        highest, lowest = extremes(self.product_units, numpy.arange(self.products.size), self.products_sold)
+        return {
+            'producto_mas_comprado': None if highest is None else self.product_row(highest),
+            'producto_menos_comprado': None if lowest is None else self.product_row(lowest)
+        }
+
+    def query3(self, args):
+        best, _ = extremes(self.seller_amounts, numpy.arange(self.sellers.size), self.sellers_sold)
+        if best is None:
+            return None
+        return {
+            'id_vendedor': int(self.sellers['id'][best]),
+            'nombre_vendedor': self.sellers['nombre'][best],
+            'monto_total_vendido': money(self.seller_amounts[best])
+        }
+
+    def query4(self, args):
+        countries = self.countries
+        totals, margins, present = self.estimate(self.seller_country, countries.size, self.amount)
+        highest, lowest = extremes(totals, name_ranks(countries['nombre']), present)
+        row = lambda code: {
+            'nombre_pais': countries['nombre'][code],
+            'monto_total_vendido': money(totals[code]),
+            'monto_total_vendido_margen': money(margins[code])
+        }
+        return ColumnarModel.extremes_rows(highest, lowest, row)
+
+    def query5(self, args):
+        n = reports.int_arg(args, 'n', reports.DEFAULT_TOP_COUNTRIES, minimum=1)
+        countries = self.countries
+        totals, margins, present = self.estimate(self.customer_country, countries.size, self.amount)
+        present = numpy.flatnonzero(present)
+        ordered = present[numpy.lexsort((countries['id'][present], totals[present]))][:n]
+        return [
+            {
+                'id_pais': int(countries['id'][code]),
+                'nombre_pais': countries['nombre'][code],
+                'monto_total_comprado': money(totals[code]),
+                'monto_total_comprado_margen': money(margins[code])
+            }
+            for code in ordered
+        ]
+
+    def query6(self, args):
+        categories = self.categories
+        units, margins, present = self.estimate(self.category, categories.size, self.quantity)
+        highest, lowest = extremes(units, name_ranks(categories['nombre']), present)
+        row = lambda code: {
+            'nombre_categoria': categories['nombre'][code],
+            'cantidad_total': int(units[code]),
+            'cantidad_total_margen': int(margins[code])
+        }
+        return {'categoria_mas_comprada': ColumnarModel.extremes_rows(highest, lowest, row)}
+
+    def query7(self, args):
+        n = reports.int_arg(args, 'n', 1, minimum=1)
+        dimension = args.get('por') or 'pais'
+        if dimension not in reports.QUERY7_BY:
+            raise ValueError(f"Dimension invalida: {dimension}")
+        countries, categories = self.countries, self.categories
+        shape = (countries.size, categories.size)
+        pairs = self.customer_country.astype(numpy.int64) * categories.size + self.category
+        units, margins, present = (array.reshape(shape) for array in self.estimate(pairs, countries.size * categories.size, self.quantity))
+        country_names = countries['nombre']
+        category_names = categories['nombre']
+        if dimension == 'categoria':
+            # Top N de paises dentro de cada categoria
+            units, margins, present = units.T, margins.T, present.T
+            group_names, item_names = category_names, country_names
+        else:
+            group_names, item_names = country_names, category_names
+        item_ranks = name_ranks(item_names)
+        result = []
+        for group in numpy.argsort(group_names, kind='stable'):
+            items = numpy.flatnonzero(present[group])
+            top = items[numpy.lexsort((item_ranks[items], -units[group][items]))][:n]
+            for item in top:
+                country, category = (item, group) if dimension == 'categoria' else (group, item)
+                result.append({
+                    'pais': country_names[country],
+                    'categoría': category_names[category],
+                    'cantidad_unidades': int(units[group][item]),
+                    'cantidad_unidades_margen': int(margins[group][item])
+                })
+        return result
+
+    # Mascara de las lineas de la muestra con fecha de orden dentro del rango (inclusive)
+    def date_mask(self, since, until):
+        mask = numpy.ones(len(self.date), dtype=bool)
+        if since is not None:
+            mask &= self.date >= numpy.datetime64(since, 'D')
+        if until is not None:
+            mask &= self.date <= numpy.datetime64(until, 'D')
+        return mask
+
+    def query8(self, args):
+        country = args.get('pais') or reports.DEFAULT_COUNTRY
+        mask = numpy.isin(self.customer_country, self.countries.codes_by_name(country))
+        mask &= self.date_mask(reports.date_arg(args, 'desde'), reports.date_arg(args, 'hasta'))
+        totals, margins, present = self.estimate(self.month, 13, self.amount, mask)
+        return [
+            {'numero_mes': int(month), 'monto_total': money(totals[month]), 'monto_total_margen': money(margins[month])}
+            for month in numpy.flatnonzero(present)
+        ]
+
+    def query9(self, args):
+        mask = self.date_mask(reports.date_arg(args, 'desde'), reports.date_arg(args, 'hasta'))
+        totals, margins, present = self.estimate(self.month, 13, self.amount, mask)
+        highest, lowest = extremes(totals, numpy.arange(13), present)
+        row = lambda month: {'mes': int(month), 'monto': money(totals[month]), 'monto_margen': money(margins[month])}
+        return ColumnarModel.extremes_rows(highest, lowest, row)
+
+    def query10(self, args):
+        category = args.get('categoria') or reports.DEFAULT_CATEGORY
+        after = reports.int_arg(args, 'despues', 0)
+        limit = reports.int_arg(args, 'limite', None, minimum=1)
+        mask = self.products_sold & numpy.isin(self.product_category, self.categories.codes_by_name(category))
+        mask &= self.products['id'] > after
+        codes = numpy.flatnonzero(mask)[:limit]
+        return [
+            {'id_producto': int(self.products['id'][code]), 'nombre_producto': self.products['nombre'][code], 'monto_total': money(self.product_amounts[code])}
+            for code in codes
+        ]
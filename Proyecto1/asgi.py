@@ -0,0 +1,123 @@
+import asyncio
+import decimal
+import json
+from datetime import date
+from urllib.parse import parse_qsl
+import aiomysql
+import reports
+import settings
+
+# Modo asincrono de la API: una aplicacion ASGI que sirve los mismos reportes /consultaN
+# con un pool de aiomysql, de modo que un solo proceso atiende muchas consultas lentas a la vez.
+# Ejecutar desde la carpeta Proyecto1 con: uvicorn asgi:app
+# La carga y el borrado de datos siguen en la API de Flask (app.py).
+# Solo funciona con MySQL; con settings.BACKEND sqlite o duckdb se usa la API de Flask.
+
+# Conexiones minimas y maximas del pool asincrono
+POOL_MIN_SIZE = 2
+POOL_MAX_SIZE = 20
+
+pool = None
+pool_lock = asyncio.Lock()
+
+# Crear el pool la primera vez que se necesita. Con autocommit cada consulta ve los datos
+# mas recientes aunque la conexion se reutilice.
+async def get_pool():
+    global pool
+    async with pool_lock:
+        if pool is None:
+            pool = await aiomysql.create_pool(
+                minsize=POOL_MIN_SIZE,
+                maxsize=POOL_MAX_SIZE,
+                autocommit=True,
+                cursorclass=aiomysql.DictCursor,
+                db=settings.DB_SETTINGS['database'],
+                host=settings.DB_SETTINGS['host'],
+                user=settings.DB_SETTINGS['user'],
+                password=settings.DB_SETTINGS['password']
+            )
+    return pool
+
+async def close_pool():
+    global pool
+    async with pool_lock:
+        if pool is not None:
+            pool.close()
+            await pool.wait_closed()
+            pool = None
+
+# Ejecutar un reporte con los parametros de la URL
+async def run_report(name, args):
+    query, params, shape = reports.report_plan(name, args)
+    db_pool = await get_pool()
+    async with db_pool.acquire() as connection:
+        async with connection.cursor() as cursor:
+            await cursor.execute(query, params)
+            rows = await cursor.fetchall()
+    return reports.shape_rows(rows, shape)
+
+# Ejecutar los diez reportes a la vez, cada uno con su conexion, y reunirlos en una sola respuesta.
+# Si un reporte falla los demas se devuelven igual y el error queda en su lugar.
+async def run_dashboard(args):
+    names = list(reports.REPORT_PLANS)
+    results = await asyncio.gather(*(run_report(name, args) for name in names), return_exceptions=True)
+    dashboard = {}
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            dashboard[name] = {'error': str(result)}
+        else:
+            dashboard[name] = result
+    return dashboard
+
+# Convertir los tipos de MySQL que json no conoce
+def json_default(value):
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+async def send_response(send, status, body, content_type):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type), (b'content-length', str(len(body)).encode())]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await get_pool()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_pool()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+# Aplicacion ASGI: /, /consulta1 a /consulta10 y /tablero
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await handle_lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+    path = scope['path'].strip('/')
+    args = dict(parse_qsl(scope['query_string'].decode()))
+    if path == '':
+        await send_response(send, 200, 'Bienvenido a la API del Proyecto 1 (modo asincrono)'.encode(), b'text/plain; charset=utf-8')
+        return
+    if path != 'tablero' and path not in reports.REPORT_PLANS:
+        await send_response(send, 404, b'Not Found', b'text/plain; charset=utf-8')
+        return
+    try:
+        if path == 'tablero':
+            result = await run_dashboard(args)
+        else:
+            result = await run_report(path, args)
+    except Exception as e:
+        await send_response(send, 200, f"Error: {str(e)}".encode(), b'text/plain; charset=utf-8')
+        return
+    body = json.dumps(result, default=json_default, sort_keys=True).encode()
+    await send_response(send, 200, body, b'application/json')
@@ -0,0 +1,228 @@
+import datetime
+import decimal
+import re
+import sqlite3
+import pandas
+
+# Motores de base de datos soportados. MySQL es el motor principal; SQLite y DuckDB se
+# ejecutan dentro del proceso, sin servidor, para nodos de analisis y pruebas locales.
+MYSQL = 'mysql'
+SQLITE = 'sqlite'
+DUCKDB = 'duckdb'
+BACKENDS = (MYSQL, SQLITE, DUCKDB)
+EMBEDDED = (SQLITE, DUCKDB)
+
+# Segundos que SQLite espera a que otra conexion libere la base de datos
+SQLITE_TIMEOUT = 30
+
+# Marcadores de pymysql (%s y %%) que se convierten al estilo ? de los motores embebidos
+PARAM_PATTERN = re.compile(r'%([s%])')
+
+# Lista VALUES (%s, ...) de un INSERT por lotes. DuckDB inserta fila por fila con executemany;
+# el lote se le pasa como una tabla (un DataFrame registrado) con INSERT ... SELECT.
+VALUES_PATTERN = re.compile(r'VALUES\s*\(\s*%s(?:\s*,\s*%s)*\s*\)')
+BATCH_TABLE = 'lote_insercion'
+
+# Dialecto de una conexion; las conexiones de pymysql no tienen el atributo
+def dialect_of(connection):
+    return getattr(connection, 'dialect', MYSQL)
+
+def check_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Motor de base de datos invalido: {name}")
+    return name
+
+# Convertir un parametro de Python al tipo que acepta el motor embebido
+def embedded_param(value, dialect):
+    if hasattr(value, 'item') and not isinstance(value, (str, bytes)):
+        # Escalares de NumPy
+        value = value.item()
+    if dialect == SQLITE:
+        if isinstance(value, datetime.datetime):
+            value = value.date() if value.time() == datetime.time() else value
+            return value.isoformat(sep=' ') if isinstance(value, datetime.datetime) else value.isoformat()
+        if isinstance(value, datetime.date):
+            return value.isoformat()
+        if isinstance(value, decimal.Decimal):
+            return float(value)
+    return value
+
+# En SQLite los montos son REAL (ver DECIMAL_PATTERN); se devuelven como Decimal con dos
+# decimales, igual que MySQL, para que las respuestas sean las mismas con cualquier motor
+def sqlite_value(value):
+    if isinstance(value, float):
+        return decimal.Decimal(repr(round(value, 2))).quantize(decimal.Decimal('0.01'))
+    return value
+
+# Cursor con la interfaz de los cursores de diccionario de pymysql
+class EmbeddedCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        # DuckDB ejecuta sobre la propia conexion; su cursor() abre otra transaccion
+        self.cursor = connection.raw if connection.dialect == DUCKDB else connection.raw.cursor()
+        self.description = None
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, query, args=None):
+        self.connection.begin()
+        if args is None:
+            self.cursor.execute(query)
+        else:
+            sql = PARAM_PATTERN.sub(lambda match: '?' if match.group(1) == 's' else '%', query)
+            self.cursor.execute(sql, [embedded_param(value, self.connection.dialect) for value in args])
+        self.description = self.cursor.description
+        self.rowcount = self.cursor.rowcount if self.description is None else -1
+        return self.rowcount
+
+    def executemany(self, query, args):
+        rows = [[embedded_param(value, self.connection.dialect) for value in row] for row in args]
+        if not rows:
+            return 0
+        self.connection.begin()
+        if self.connection.dialect == DUCKDB and VALUES_PATTERN.search(query):
+            self.insert_frame(query, rows)
+        else:
+            sql = PARAM_PATTERN.sub(lambda match: '?' if match.group(1) == 's' else '%', query)
+            self.cursor.executemany(sql, rows)
+        self.description = None
+        self.rowcount = len(rows)
+        return self.rowcount
+
+    def insert_frame(self, query, rows):
+        width = len(rows[0])
+        frame = pandas.DataFrame({f"c{index}": [row[index] for row in rows] for index in range(width)})
+        self.cursor.register(BATCH_TABLE, frame)
+        try:
+            self.cursor.execute(VALUES_PATTERN.sub(f"SELECT * FROM {BATCH_TABLE}", query, count=1))
+        finally:
+            self.cursor.unregister(BATCH_TABLE)
+
+    def row(self, values):
+        if self.connection.dialect == SQLITE:
+            values = [sqlite_value(value) for value in values]
+        return dict(zip([column[0] for column in self.description], values))
+
+    def fetchone(self):
+        if self.description is None:
+            return None
+        values = self.cursor.fetchone()
+        return None if values is None else self.row(values)
+
+    def fetchall(self):
+        if self.description is None:
+            return []
+        return [self.row(values) for values in self.cursor.fetchall()]
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    # Los motores embebidos no devuelven varios resultados por llamada
+    def nextset(self):
+        return None
+
+    def close(self):
+        if self.connection.dialect == SQLITE:
+            self.cursor.close()
+
+# Conexion a un motor embebido con la interfaz de pymysql que usa el resto de la API:
+# cursor(), commit(), rollback(), ping() y close(). La transaccion se abre con la primera
+# sentencia y termina con commit o rollback.
+class EmbeddedConnection:
+    def __init__(self, raw, dialect, cursorclass=EmbeddedCursor):
+        self.raw = raw
+        self.dialect = dialect
+        self.cursorclass = cursorclass
+        self.in_transaction = False
+
+    # Se ignora la clase de cursor de pymysql que se pida; todos devuelven diccionarios
+    def cursor(self, cursor=None):
+        return self.cursorclass(self)
+
+    def begin(self):
+        if not self.in_transaction:
+            self.raw.execute("BEGIN TRANSACTION;")
+            self.in_transaction = True
+
+    def commit(self):
+        if self.in_transaction:
+            self.in_transaction = False
+            self.raw.execute("COMMIT;")
+
+    def rollback(self):
+        if self.in_transaction:
+            self.in_transaction = False
+            self.raw.execute("ROLLBACK;")
+
+    def ping(self, reconnect=False):
+        self.raw.execute("SELECT 1;")
+
+    def close(self):
+        self.raw.close()
+
+# Abrir una conexion a un motor embebido guardado en path
+def connect_embedded(dialect, path, cursorclass=EmbeddedCursor):
+    if dialect == SQLITE:
+        # Sin transacciones implicitas: las maneja EmbeddedConnection
+        raw = sqlite3.connect(path, timeout=SQLITE_TIMEOUT, isolation_level=None, check_same_thread=False)
+        raw.execute("PRAGMA journal_mode = WAL;")
+    elif dialect == DUCKDB:
+        import duckdb
+        raw = duckdb.connect(path)
+    else:
+        raise ValueError(f"Motor embebido invalido: {dialect}")
+    return EmbeddedConnection(raw, dialect, cursorclass)
+
+# Ajustes de las sentencias CREATE TABLE escritas para MySQL
+DDL_REPLACEMENTS = {
+    SQLITE: [
+        (' AUTO_INCREMENT', ''),
+        ('mes TINYINT AS (MONTH(fecha)) STORED', "mes INTEGER GENERATED ALWAYS AS (CAST(strftime('%m', fecha) AS INTEGER)) STORED")
+    ],
+    DUCKDB: [
+        (' AUTO_INCREMENT', ''),
+        ('mes TINYINT AS (MONTH(fecha)) STORED', 'mes TINYINT GENERATED ALWAYS AS (month(fecha)) VIRTUAL')
+    ]
+}
+
+# Columnas DECIMAL. En SQLite se declaran REAL: con afinidad NUMERIC una suma entera de montos
+# volveria como int y no como monto con dos decimales
+DECIMAL_PATTERN = re.compile(r'DECIMAL\s*\(\s*\d+\s*,\s*\d+\s*\)')
+
+# Llave foranea dentro de un CREATE TABLE
+FOREIGN_KEY_PATTERN = re.compile(r',\s*FOREIGN KEY \(\w+\) REFERENCES \w+\(\w+\)')
+
+# Traducir una sentencia CREATE TABLE al dialecto. En los motores embebidos las llaves
+# foraneas no se declaran (no se pueden agregar despues); se validan al terminar la carga.
+def translate_ddl(statement, dialect):
+    if dialect == MYSQL:
+        return statement
+    for old, new in DDL_REPLACEMENTS[dialect]:
+        statement = statement.replace(old, new)
+    if dialect == SQLITE:
+        statement = DECIMAL_PATTERN.sub('REAL', statement)
+    return FOREIGN_KEY_PATTERN.sub('', statement)
+
+# Año de una columna de fecha
+def year_sql(column, dialect):
+    if dialect == SQLITE:
+        return f"CAST(strftime('%Y', {column}) AS INTEGER)"
+    return f"YEAR({column})"
+
+# Clausula para insertar o actualizar por llave primaria. additive suma el valor nuevo al
+# guardado; si no, lo reemplaza.
+def upsert_clause(dialect, keys, columns, additive=False):
+    if dialect == MYSQL:
+        assignments = [f"{column} = {column} + VALUES({column})" if additive else f"{column} = VALUES({column})" for column in columns]
+        return "ON DUPLICATE KEY UPDATE " + ', '.join(assignments)
+    assignments = [f"{column} = {column} + excluded.{column}" if additive else f"{column} = excluded.{column}" for column in columns]
+    return f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET " + ', '.join(assignments)
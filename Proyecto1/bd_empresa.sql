@@ -46,6 +46,7 @@ CREATE TABLE vendedor (
 CREATE TABLE orden (
 	id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
     fecha DATE NOT NULL,
+    mes TINYINT AS (MONTH(fecha)) STORED,
     cliente_id INT NOT NULL,
 	FOREIGN KEY (cliente_id) REFERENCES cliente(id)
 );
@@ -57,7 +58,71 @@ CREATE TABLE detalle_orden (
     producto_id INT NOT NULL,
     vendedor_id INT NOT NULL,
     orden_id INT NOT NULL,
+    fecha DATE NOT NULL,
+    mes TINYINT AS (MONTH(fecha)) STORED,
+    monto DECIMAL (14, 2) NOT NULL DEFAULT 0,
 	FOREIGN KEY (producto_id) REFERENCES producto(id),
 	FOREIGN KEY (vendedor_id) REFERENCES vendedor(id),
 	FOREIGN KEY (orden_id) REFERENCES orden(id)
-);
\ No newline at end of file
+);
+
+CREATE TABLE resumen_cliente (
+	cliente_id INT NOT NULL PRIMARY KEY,
+    monto_total DECIMAL (16, 2) NOT NULL,
+    lineas BIGINT NOT NULL,
+	FOREIGN KEY (cliente_id) REFERENCES cliente(id)
+);
+
+CREATE TABLE resumen_producto (
+	producto_id INT NOT NULL PRIMARY KEY,
+    cantidad_unidades BIGINT NOT NULL,
+    monto_vendido DECIMAL (16, 2) NOT NULL,
+    lineas BIGINT NOT NULL,
+	FOREIGN KEY (producto_id) REFERENCES producto(id)
+);
+
+CREATE TABLE resumen_vendedor (
+	vendedor_id INT NOT NULL PRIMARY KEY,
+    monto_total DECIMAL (16, 2) NOT NULL,
+    lineas BIGINT NOT NULL,
+	FOREIGN KEY (vendedor_id) REFERENCES vendedor(id)
+);
+
+CREATE TABLE resumen_pais_mes (
+	pais_id INT NOT NULL,
+    anio SMALLINT NOT NULL,
+    mes TINYINT NOT NULL,
+    monto_total DECIMAL (16, 2) NOT NULL,
+    lineas BIGINT NOT NULL,
+	PRIMARY KEY (pais_id, anio, mes),
+	FOREIGN KEY (pais_id) REFERENCES pais(id)
+);
+
+CREATE TABLE resumen_pais_categoria (
+	pais_id INT NOT NULL,
+    categoria_id INT NOT NULL,
+    cantidad_unidades BIGINT NOT NULL,
+    monto_total DECIMAL (16, 2) NOT NULL,
+    lineas BIGINT NOT NULL,
+	PRIMARY KEY (pais_id, categoria_id),
+	FOREIGN KEY (pais_id) REFERENCES pais(id),
+	FOREIGN KEY (categoria_id) REFERENCES categoria(id)
+);
+
+CREATE TABLE resumen_control (
+	id TINYINT NOT NULL PRIMARY KEY,
+    ultima_orden INT NOT NULL,
+    version_datos VARCHAR (32) NOT NULL DEFAULT ''
+);
+
+CREATE INDEX idx_pais_nombre ON pais (nombre);
+CREATE INDEX idx_categoria_nombre ON categoria (nombre);
+CREATE INDEX idx_orden_fecha ON orden (fecha);
+CREATE INDEX idx_orden_mes ON orden (mes);
+CREATE INDEX idx_detalle_producto_cantidad ON detalle_orden (producto_id, cantidad);
+CREATE INDEX idx_detalle_orden_cubre ON detalle_orden (orden_id, producto_id, vendedor_id, cantidad, monto);
+CREATE INDEX idx_detalle_fecha_cubre ON detalle_orden (fecha, mes, orden_id, monto);
+CREATE INDEX idx_resumen_cliente_monto ON resumen_cliente (monto_total);
+CREATE INDEX idx_resumen_producto_cantidad ON resumen_producto (cantidad_unidades);
+CREATE INDEX idx_resumen_vendedor_monto ON resumen_vendedor (monto_total);
+CREATE INDEX idx_resumen_pais_mes_mes ON resumen_pais_mes (mes);
\ No newline at end of file
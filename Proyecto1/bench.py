@@ -0,0 +1,286 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy
+import pandas
+import pymysql
+import backends
+import loader
+import reports
+import schema
+import settings
+
+# Banco de pruebas de rendimiento: genera datos sinteticos con los mismos esquemas que los CSV
+# del proyecto, mide la carga del modelo (filas por segundo) y la latencia de /consulta1 a
+# /consulta10 (p50, p95 y p99) con varias peticiones a la vez, y escribe el resultado en JSON
+# para compararlo entre ejecuciones.
+#
+# Uso: python Proyecto1/bench.py [--objetivo mysql|sqlite|duckdb] [--escala 1|10|100] [--salida r.json] [--comparar base.json]
+# Todos los objetivos usan la API (app.py). mysql recrea la base de datos --base (por defecto
+# empresa_bench); la de settings.py solo se usa si se pide con --usar-base-configurada.
+
+# Tamanos de la escala 1, iguales a los de los archivos del proyecto
+BASE_PRODUCTS = 10000
+BASE_CUSTOMERS = 20000
+BASE_SELLERS = 100
+BASE_ORDERS = 12000
+MAX_LINES_PER_ORDER = 9
+
+# Rango de fechas de las ordenes generadas
+FIRST_DATE = numpy.datetime64('2000-01-01')
+LAST_DATE = numpy.datetime64('2023-12-31')
+
+# Base de datos de MySQL que el banco de pruebas borra y vuelve a crear
+DEFAULT_BENCH_DATABASE = 'empresa_bench'
+
+DEFAULT_REQUESTS = 50
+DEFAULT_CONCURRENCY = 4
+PERCENTILES = (50, 95, 99)
+
+FIRST_NAMES = ['Ana', 'Luis', 'Maria', 'Carlos', 'Sofia', 'Jorge', 'Elena', 'Pedro', 'Lucia', 'Diego']
+LAST_NAMES = ['Lopez', 'Garcia', 'Perez', 'Martinez', 'Gomez', 'Diaz', 'Ruiz', 'Torres', 'Flores', 'Castro']
+
+# Generar los seis CSV a la escala indicada. Categorias y paises se copian de los originales
+# para que los reportes con valores por defecto (Deportes, Inglaterra) tengan datos.
+def generate(directory, scale=1, seed=0):
+    rng = numpy.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    for file_name in ('Categorias.csv', 'paises.csv'):
+        shutil.copy(os.path.join(loader.DATA_DIR, file_name), os.path.join(directory, file_name))
+    categories = len(pandas.read_csv(os.path.join(directory, 'Categorias.csv'), delimiter=';'))
+    countries = len(pandas.read_csv(os.path.join(directory, 'paises.csv'), delimiter=';'))
+    products = max(int(BASE_PRODUCTS * scale), 1)
+    customers = max(int(BASE_CUSTOMERS * scale), 1)
+    sellers = max(int(BASE_SELLERS * scale), 1)
+    orders = max(int(BASE_ORDERS * scale), 1)
+    write = lambda df, file_name, **options: df.to_csv(os.path.join(directory, file_name), sep=';', index=False, **options)
+    ids = numpy.arange(1, products + 1)
+    write(pandas.DataFrame({
+        'id_producto': ids,
+        'Nombre': [f"PRODUCTO {i}" for i in ids],
+        'Precio': rng.integers(99, 3000, products) / 100,
+        'id_categoria': rng.integers(1, categories + 1, products)
+    }), 'productos.csv')
+    ids = numpy.arange(1, customers + 1)
+    write(pandas.DataFrame({
+        'id_cliente': ids,
+        'Nombre': rng.choice(FIRST_NAMES, customers),
+        'Apellido': rng.choice(LAST_NAMES, customers),
+        'Direccion': [f"{i} Calle {i % 97}" for i in ids],
+        'Telefono': rng.integers(10 ** 9, 10 ** 10, customers),
+        'Tarjeta': rng.integers(10 ** 15, 10 ** 16, customers),
+        'Edad': rng.integers(18, 91, customers),
+        'Salario': rng.integers(1, 21, customers) * 10000,
+        'Genero': rng.choice(['F', 'M'], customers),
+        'id_pais': rng.integers(1, countries + 1, customers)
+    }), 'clientes.csv')
+    ids = numpy.arange(1, sellers + 1)
+    write(pandas.DataFrame({
+        'id_vendedor': ids,
+        'nombre': [f"Vendedor {i}" for i in ids],
+        'id_pais': rng.integers(1, countries + 1, sellers)
+    }), 'vendedores.csv')
+    # Cada orden tiene de 1 a MAX_LINES_PER_ORDER lineas con la misma fecha y cliente
+    lines = rng.integers(1, MAX_LINES_PER_ORDER + 1, orders)
+    order_ids = numpy.repeat(numpy.arange(1, orders + 1), lines)
+    line_numbers = numpy.arange(len(order_ids)) - numpy.repeat(numpy.cumsum(lines) - lines, lines) + 1
+    days = (LAST_DATE - FIRST_DATE).astype(int)
+    dates = pandas.to_datetime(FIRST_DATE + rng.integers(0, days + 1, orders)).strftime('%d/%m/%Y').to_numpy()
+    write(pandas.DataFrame({
+        'id_orden': order_ids,
+        'linea_orden': line_numbers,
+        'fecha_orden': numpy.repeat(dates, lines),
+        'id_cliente': numpy.repeat(rng.integers(1, customers + 1, orders), lines),
+        'id_vendedor': rng.integers(1, sellers + 1, len(order_ids)),
+        'id_producto': rng.integers(1, products + 1, len(order_ids)),
+        'cantidad': rng.integers(1, 11, len(order_ids))
+    }), 'ordenes.csv', encoding='utf-8-sig')
+    return {'productos': products, 'clientes': customers, 'vendedores': sellers, 'ordenes': orders, 'lineas': len(order_ids)}
+
+# Latencias en milisegundos resumidas en percentiles
+def summarize_latencies(latencies, errors, seconds):
+    result = {'peticiones': len(latencies) + errors, 'errores': errors}
+    if latencies:
+        values = numpy.array(latencies) * 1000
+        for percentile in PERCENTILES:
+            result[f'p{percentile}_ms'] = round(float(numpy.percentile(values, percentile)), 3)
+        result['media_ms'] = round(float(values.mean()), 3)
+    result['peticiones_por_segundo'] = round((len(latencies) + errors) / seconds, 1) if seconds > 0 else None
+    return result
+
+# Ejecutar call(i) requests veces con concurrency hilos y medir cada llamada.
+# call devuelve True si la respuesta fue correcta.
+def measure(call, requests, concurrency):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def run(index):
+        nonlocal errors
+        start = time.perf_counter()
+        ok = call(index)
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run, range(requests)))
+    return summarize_latencies(latencies, errors, time.perf_counter() - start)
+
+# Objetivo: la API de Flask en el mismo proceso, con su pool y el motor de base de datos indicado.
+# Con mysql se recrea la base de datos --base; sqlite y duckdb usan un archivo temporal.
+class ApiTarget:
+    def __init__(self, options):
+        self.name = options.objetivo
+        self.options = options
+        self.directory = None
+        settings.BACKEND = options.objetivo
+        if options.objetivo in backends.EMBEDDED:
+            self.directory = tempfile.mkdtemp(prefix=f'bench_{options.objetivo}_')
+            settings.EMBEDDED_PATH = os.path.join(self.directory, 'empresa.db')
+        else:
+            self.use_bench_database(options)
+        # app lee settings al importarse
+        import app
+        self.app = app
+        self.client = app.app.test_client()
+
+    # Apuntar la API a la base de datos del banco de pruebas, creandola si no existe: la API
+    # se conecta a ella antes de que /crearmodelo la recree
+    @staticmethod
+    def use_bench_database(options):
+        statement = schema.database_ddl(options.base)[1].replace('CREATE DATABASE', 'CREATE DATABASE IF NOT EXISTS')
+        server = {key: value for key, value in settings.DB_SETTINGS.items() if key != 'database'}
+        with pymysql.connect(**server) as connection, connection.cursor() as cursor:
+            cursor.execute(statement)
+        settings.DB_SETTINGS = dict(settings.DB_SETTINGS, database=options.base)
+
+    def get(self, path):
+        response = self.client.get(path)
+        body = response.get_data(as_text=True)
+        if response.status_code != 200 or body.startswith('Error:'):
+            return None
+        return response
+
+    def load(self, directory):
+        loader.DATA_DIR = directory
+        if self.get('/crearmodelo?particionar=1' if self.options.particionar else '/crearmodelo') is None:
+            raise RuntimeError("No se pudo crear el modelo")
+        params = f"lote={self.options.lote}&modo={self.options.modo}"
+        if self.options.hilos:
+            params += f"&hilos={self.options.hilos}"
+        if self.options.bloque:
+            params += f"&bloque={self.options.bloque}"
+        if self.options.validar:
+            params += "&validar=1"
+            if self.options.procesos:
+                params += f"&procesos={self.options.procesos}"
+        response = self.get('/cargarmodelo?' + params)
+        if response is None:
+            raise RuntimeError("No se pudo cargar el modelo")
+        return response.get_json()['tablas']
+
+    def report(self, name, index):
+        # Un parametro distinto en cada peticion evita el cache de reportes, salvo con --cache
+        path = f"/{name}" if self.options.cache else f"/{name}?bench={index}"
+        if self.options.aproximado:
+            path += ('&' if '?' in path else '?') + 'approx=1'
+        return self.get(path) is not None
+
+    def close(self):
+        if self.directory:
+            self.app.pool.close()
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+# Diferencia porcentual de cada metrica respecto a una ejecucion anterior
+def compare(current, previous):
+    result = {}
+    before = previous.get('carga', {}).get('filas_por_segundo')
+    if before:
+        result['carga_filas_por_segundo'] = round(100 * (current['carga']['filas_por_segundo'] - before) / before, 1)
+    for name, entry in current['consultas'].items():
+        old = previous.get('consultas', {}).get(name, {})
+        result[name] = {
+            metric: round(100 * (entry[metric] - old[metric]) / old[metric], 1)
+            for metric in [f'p{percentile}_ms' for percentile in PERCENTILES]
+            if old.get(metric) and metric in entry
+        }
+    return result
+
+def run(options):
+    target = ApiTarget(options)
+    data_directory = options.datos or tempfile.mkdtemp(prefix='bench_datos_')
+    try:
+        sizes = generate(data_directory, options.escala, options.semilla)
+        start = time.perf_counter()
+        tables = target.load(data_directory)
+        seconds = time.perf_counter() - start
+        rows = sum(entry['filas'] for entry in tables)
+        result = {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'objetivo': target.name,
+            'escala': options.escala,
+            'peticiones': options.peticiones,
+            'concurrencia': options.concurrencia,
+            'datos': sizes,
+            'carga': {'filas': rows, 'segundos': round(seconds, 3), 'filas_por_segundo': round(rows / seconds, 1), 'tablas': tables},
+            'consultas': {}
+        }
+        for name in reports.REPORT_PLANS:
+            result['consultas'][name] = measure(lambda index: target.report(name, index), options.peticiones, options.concurrencia)
+    finally:
+        target.close()
+        if not options.datos:
+            shutil.rmtree(data_directory, ignore_errors=True)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Medir la carga del modelo y la latencia de los reportes')
+    parser.add_argument('--objetivo', choices=backends.BACKENDS, default=backends.SQLITE)
+    parser.add_argument('--base', default=DEFAULT_BENCH_DATABASE, help='Base de datos de MySQL que se recrea (solo mysql)')
+    parser.add_argument('--usar-base-configurada', action='store_true', help='Permitir que --base sea la base de datos de settings.py')
+    parser.add_argument('--escala', type=float, default=1)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--datos', help='Carpeta donde dejar los CSV generados (por defecto una temporal)')
+    parser.add_argument('--peticiones', type=int, default=DEFAULT_REQUESTS)
+    parser.add_argument('--concurrencia', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--lote', type=int, default=loader.DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--modo', choices=loader.MODES, default=loader.MODE_BATCH)
+    parser.add_argument('--hilos', type=int)
+    parser.add_argument('--bloque', type=int)
+    parser.add_argument('--particionar', action='store_true', help='Particionar detalle_orden por año (solo mysql)')
+    parser.add_argument('--validar', action='store_true', help='Validar los CSV con staging antes de cargarlos')
+    parser.add_argument('--procesos', type=int, help='Procesos para parsear los CSV con --validar')
+    parser.add_argument('--aproximado', action='store_true', help='Medir los reportes en modo aproximado (?approx=1)')
+    parser.add_argument('--cache', action='store_true', help='Permitir respuestas del cache de reportes')
+    parser.add_argument('--salida', help='Archivo JSON con el resultado')
+    parser.add_argument('--comparar', help='Resultado JSON anterior con el que comparar')
+    options = parser.parse_args()
+    # No borrar por accidente la base de datos real de la API
+    if options.objetivo == backends.MYSQL and options.base == settings.DB_SETTINGS['database'] and not options.usar_base_configurada:
+        parser.error(f"--base {options.base} es la base de datos de settings.py y se borraria; use otra o agregue --usar-base-configurada")
+    result = run(options)
+    if options.comparar:
+        with open(options.comparar, encoding='utf-8') as f:
+            result['comparacion'] = compare(result, json.load(f))
+    output = json.dumps(result, indent=4)
+    if options.salida:
+        with open(options.salida, 'w', encoding='utf-8') as f:
+            f.write(output)
+    print(output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
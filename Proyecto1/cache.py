@@ -0,0 +1,122 @@
+import collections
+import hashlib
+import threading
+import time
+
+# Cache en memoria de respuestas de reportes con TTL, tamano maximo y desalojo LRU.
+# Cada entrada guarda la version de datos con la que se calculo; al cambiar los datos
+# se incrementa la version y las entradas anteriores dejan de ser validas.
+# Con varios procesos (gunicorn, la API asincrona) cada uno tiene su cache: shared_version()
+# devuelve la version de los datos compartida entre procesos, o None si no se conoce (y
+# entonces no se usa el cache), y forma parte de la version de cada entrada.
+class ReportCache:
+    def __init__(self, max_entries=256, ttl=300, shared_version=None):
+        if max_entries < 1:
+            raise ValueError("El cache debe admitir al menos una entrada")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared_version = shared_version
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    # Version de los datos con la que se busca y se guarda una entrada; None si no se conoce
+    def current_version(self):
+        if self.shared_version is None:
+            return self.version, None
+        shared = self.shared_version()
+        return None if shared is None else (self.version, shared)
+
+    # Buscar una entrada vigente calculada con version; devuelve (cuerpo, etag) o None
+    def get(self, key, version):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or version is None or entry['version'] != version or entry['expires'] <= now:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            # Marcar la entrada como la usada mas recientemente
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry['body'], entry['etag']
+
+    # Guardar un cuerpo calculado con la version de datos indicada y devolver (cuerpo, etag).
+    # Si los datos cambiaron mientras se calculaba, el resultado no se guarda; si cambiaron en
+    # otro proceso, la version compartida ya no coincide y la entrada no se vuelve a usar.
+    def put(self, key, version, body):
+        etag = hashlib.sha1(body).hexdigest()
+        with self.lock:
+            if version is not None and version[0] == self.version:
+                self.entries[key] = {
+                    'version': version,
+                    'expires': time.monotonic() + self.ttl,
+                    'body': body,
+                    'etag': etag
+                }
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return body, etag
+
+    # Invalidar todo el cache al modificarse los datos
+    def invalidate(self):
+        with self.lock:
+            self.version += 1
+            self.entries.clear()
+
+    # Estado del cache
+    def stats(self):
+        with self.lock:
+            return {
+                'version': self.version,
+                'entradas': len(self.entries),
+                'max_entradas': self.max_entries,
+                'ttl': self.ttl,
+                'aciertos': self.hits,
+                'fallos': self.misses
+            }
+
+# Version de los datos compartida entre procesos, leida con read() como maximo una vez por
+# intervalo (en segundos): entre lecturas se devuelve la ultima leida, asi un acierto del
+# cache o un reporte en memoria no consultan la base de datos en cada peticion. Un cambio
+# hecho en este proceso la guarda con set() sin esperar al intervalo. Mientras un hilo la
+# vuelve a leer, los demas siguen con la anterior.
+class SharedVersion:
+    def __init__(self, read, interval=0.5):
+        self.read = read
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.value = None
+        self.expires = None
+        self.reading = False
+
+    # Version vigente, o None si no se conoce
+    def get(self):
+        now = time.monotonic()
+        with self.lock:
+            if self.reading or (self.expires is not None and now < self.expires):
+                return self.value
+            self.reading = True
+            generation = self.expires
+        value = None
+        try:
+            value = self.read()
+        finally:
+            with self.lock:
+                self.reading = False
+                # Si entretanto se guardo una version con set(), esa es la vigente
+                if self.expires == generation:
+                    self.value = value
+                    self.expires = time.monotonic() + self.interval
+                value = self.value
+        return value
+
+    # Guardar la version publicada por este proceso
+    def set(self, version):
+        with self.lock:
+            self.value = version
+            self.expires = time.monotonic() + self.interval
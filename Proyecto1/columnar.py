@@ -0,0 +1,320 @@
+import decimal
+import threading
+import numpy
+import pandas
+import reports
+
+# Motor analitico en memoria: guarda las tablas del modelo como arreglos de NumPy y responde los
+# diez reportes con agregaciones vectorizadas (bincount) sin consultar la base de datos.
+# Las dimensiones (categoria, producto, pais, cliente, vendedor, orden) se codifican como
+# diccionarios: cada id se reemplaza por su posicion 0..n-1 en la dimension ordenada por id.
+
+# Columnas que el motor necesita de cada tabla
+TABLE_COLUMNS = {
+    'categoria': ['id', 'nombre'],
+    'producto': ['id', 'nombre', 'precio', 'categoria_id'],
+    'pais': ['id', 'nombre'],
+    'cliente': ['id', 'nombre', 'apellido', 'pais_id'],
+    'vendedor': ['id', 'nombre', 'pais_id'],
+    'orden': ['id', 'fecha', 'cliente_id'],
+    'detalle_orden': ['cantidad', 'producto_id', 'vendedor_id', 'orden_id']
+}
+
+# Convertir centavos a un Decimal con dos decimales, como los devuelve MySQL
+def money(cents):
+    return decimal.Decimal(int(cents)).scaleb(-2)
+
+# Posicion de cada nombre en orden alfabetico, para desempatar igual que los reportes SQL
+def name_ranks(names):
+    return numpy.argsort(numpy.argsort(names, kind='stable'), kind='stable')
+
+# Indices del mayor y del menor valor de metric entre las filas de mask, desempatando por tie
+def extremes(metric, tie, mask):
+    candidates = numpy.flatnonzero(mask)
+    if len(candidates) == 0:
+        return None, None
+    highest = candidates[numpy.lexsort((tie[candidates], -metric[candidates]))[0]]
+    lowest = candidates[numpy.lexsort((tie[candidates], metric[candidates]))[0]]
+    return highest, lowest
+
+# Dimension codificada como diccionario
+class Dimension:
+    def __init__(self, df):
+        df = df.sort_values('id').reset_index(drop=True)
+        self.size = len(df)
+        self.index = pandas.Index(df['id'].to_numpy())
+        self.columns = {column: df[column].to_numpy() for column in df.columns}
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    # Convertir ids a codigos, verificando que todos existan
+    def codes(self, ids):
+        codes = self.index.get_indexer(ids)
+        if len(codes) and codes.min() < 0:
+            raise ValueError("Hay referencias a ids que no existen en la dimension")
+        return codes.astype(numpy.int32)
+
+    # Codigos de las filas con un nombre dado
+    def codes_by_name(self, name):
+        return numpy.flatnonzero(self.columns['nombre'] == name)
+
+class ColumnarModel:
+    def __init__(self, tables):
+        self.categories = Dimension(tables['categoria'])
+        self.products = Dimension(tables['producto'])
+        self.countries = Dimension(tables['pais'])
+        self.customers = Dimension(tables['cliente'])
+        self.sellers = Dimension(tables['vendedor'])
+        self.orders = Dimension(tables['orden'])
+        details = tables['detalle_orden']
+        # Relaciones de las dimensiones como codigos
+        product_category = self.categories.codes(self.products['categoria_id'])
+        product_price = numpy.rint(self.products['precio'].astype(numpy.float64) * 100).astype(numpy.int64)
+        customer_country = self.countries.codes(self.customers['pais_id'])
+        seller_country = self.countries.codes(self.sellers['pais_id'])
+        order_customer = self.customers.codes(self.orders['cliente_id'])
+        order_date = pandas.to_datetime(pandas.Series(self.orders['fecha'])).to_numpy().astype('datetime64[D]')
+        # Arreglos de hechos, uno por linea de detalle_orden
+        order = self.orders.codes(details['orden_id'].to_numpy())
+        self.product = self.products.codes(details['producto_id'].to_numpy())
+        self.seller = self.sellers.codes(details['vendedor_id'].to_numpy())
+        self.quantity = details['cantidad'].to_numpy().astype(numpy.int64)
+        self.amount = self.quantity * product_price[self.product]
+        self.customer = order_customer[order]
+        self.customer_country = customer_country[self.customer]
+        self.seller_country = seller_country[self.seller]
+        self.category = product_category[self.product]
+        self.date = order_date[order]
+        self.month = (self.date.astype('datetime64[M]').astype(numpy.int64) % 12 + 1).astype(numpy.int8)
+        self.product_category = product_category
+        self.customer_country_of = customer_country
+        self.rows = len(self.quantity)
+
+    # Crear el modelo leyendo las tablas de la base de datos
+    @classmethod
+    def from_connection(cls, connection):
+        tables = {}
+        with connection.cursor() as cursor:
+            for table, columns in TABLE_COLUMNS.items():
+                cursor.execute(f"SELECT {', '.join(columns)} FROM {table};")
+                tables[table] = pandas.DataFrame(list(cursor.fetchall()), columns=columns)
+        return cls(tables)
+
+    # Suma de values (o conteo de filas) por codigo
+    @staticmethod
+    def totals(codes, size, values=None):
+        if values is None:
+            return numpy.bincount(codes, minlength=size)
+        return numpy.rint(numpy.bincount(codes, weights=values, minlength=size)).astype(numpy.int64)
+
+    def run(self, name, args):
+        return getattr(self, 'query' + name[len('consulta'):])(args)
+
+    def query1(self, args):
+        totals = self.totals(self.customer, self.customers.size, self.amount)
+        present = self.totals(self.customer, self.customers.size) > 0
+        best, _ = extremes(totals, numpy.arange(self.customers.size), present)
+        if best is None:
+            return None
+        return {
+            'id_cliente': int(self.customers['id'][best]),
+            'nombre_cliente': self.customers['nombre'][best],
+            'apellido_cliente': self.customers['apellido'][best],
+            'pais_cliente': self.countries['nombre'][self.customer_country_of[best]],
+            'monto_total': money(totals[best])
+        }
+
+    def product_row(self, code, units, amounts):
+        return {
+            'id_producto': int(self.products['id'][code]),
+            'nombre_producto': self.products['nombre'][code],
+            'categoria_producto': self.categories['nombre'][self.product_category[code]],
+            'cantidad_unidades': int(units[code]),
+            'monto_vendido': money(amounts[code])
+        }
+
+    def query2(self, args):
+        units = self.totals(self.product, self.products.size, self.quantity)
+        amounts = self.totals(self.product, self.products.size, self.amount)
+        present = self.totals(self.product, self.products.size) > 0
+        highest, lowest = extremes(units, numpy.arange(self.products.size), present)
+        return {
+            'producto_mas_comprado': None if highest is None else self.product_row(highest, units, amounts),
+            'producto_menos_comprado': None if lowest is None else self.product_row(lowest, units, amounts)
+        }
+
+    def query3(self, args):
+        totals = self.totals(self.seller, self.sellers.size, self.amount)
+        present = self.totals(self.seller, self.sellers.size) > 0
+        best, _ = extremes(totals, numpy.arange(self.sellers.size), present)
+        if best is None:
+            return None
+        return {
+            'id_vendedor': int(self.sellers['id'][best]),
+            'nombre_vendedor': self.sellers['nombre'][best],
+            'monto_total_vendido': money(totals[best])
+        }
+
+    # Lista con el maximo y el minimo sin repetir la fila si coinciden
+    @staticmethod
+    def extremes_rows(highest, lowest, row):
+        if highest is None:
+            return []
+        return [row(highest)] if highest == lowest else [row(highest), row(lowest)]
+
+    def query4(self, args):
+        totals = self.totals(self.seller_country, self.countries.size, self.amount)
+        present = self.totals(self.seller_country, self.countries.size) > 0
+        highest, lowest = extremes(totals, name_ranks(self.countries['nombre']), present)
+        row = lambda code: {'nombre_pais': self.countries['nombre'][code], 'monto_total_vendido': money(totals[code])}
+        return self.extremes_rows(highest, lowest, row)
+
+    def query5(self, args):
+        n = reports.int_arg(args, 'n', reports.DEFAULT_TOP_COUNTRIES, minimum=1)
+        totals = self.totals(self.customer_country, self.countries.size, self.amount)
+        present = numpy.flatnonzero(self.totals(self.customer_country, self.countries.size) > 0)
+        ordered = present[numpy.lexsort((self.countries['id'][present], totals[present]))][:n]
+        return [
+            {'id_pais': int(self.countries['id'][code]), 'nombre_pais': self.countries['nombre'][code], 'monto_total_comprado': money(totals[code])}
+            for code in ordered
+        ]
+
+    def query6(self, args):
+        units = self.totals(self.category, self.categories.size, self.quantity)
+        present = self.totals(self.category, self.categories.size) > 0
+        highest, lowest = extremes(units, name_ranks(self.categories['nombre']), present)
+        row = lambda code: {'nombre_categoria': self.categories['nombre'][code], 'cantidad_total': int(units[code])}
+        return {'categoria_mas_comprada': self.extremes_rows(highest, lowest, row)}
+
+    def query7(self, args):
+        n = reports.int_arg(args, 'n', 1, minimum=1)
+        dimension = args.get('por') or 'pais'
+        if dimension not in reports.QUERY7_BY:
+            raise ValueError(f"Dimension invalida: {dimension}")
+        size = self.countries.size * self.categories.size
+        pairs = self.customer_country.astype(numpy.int64) * self.categories.size + self.category
+        units = self.totals(pairs, size, self.quantity).reshape(self.countries.size, self.categories.size)
+        present = (self.totals(pairs, size) > 0).reshape(self.countries.size, self.categories.size)
+        country_names = self.countries['nombre']
+        category_names = self.categories['nombre']
+        if dimension == 'categoria':
+            # Top N de paises dentro de cada categoria
+            units, present = units.T, present.T
+            group_names, item_names = category_names, country_names
+        else:
+            group_names, item_names = country_names, category_names
+        item_ranks = name_ranks(item_names)
+        result = []
+        for group in numpy.argsort(group_names, kind='stable'):
+            items = numpy.flatnonzero(present[group])
+            top = items[numpy.lexsort((item_ranks[items], -units[group][items]))][:n]
+            for item in top:
+                country, category = (item, group) if dimension == 'categoria' else (group, item)
+                result.append({
+                    'pais': country_names[country],
+                    'categoría': category_names[category],
+                    'cantidad_unidades': int(units[group][item])
+                })
+        return result
+
+    # Mascara de las lineas con fecha de orden dentro del rango (inclusive)
+    def date_mask(self, since, until):
+        mask = numpy.ones(self.rows, dtype=bool)
+        if since is not None:
+            mask &= self.date >= numpy.datetime64(since, 'D')
+        if until is not None:
+            mask &= self.date <= numpy.datetime64(until, 'D')
+        return mask
+
+    def query8(self, args):
+        country = args.get('pais') or reports.DEFAULT_COUNTRY
+        mask = numpy.isin(self.customer_country, self.countries.codes_by_name(country))
+        mask &= self.date_mask(reports.date_arg(args, 'desde'), reports.date_arg(args, 'hasta'))
+        totals = self.totals(self.month[mask], 13, self.amount[mask])
+        present = self.totals(self.month[mask], 13) > 0
+        return [{'numero_mes': int(month), 'monto_total': money(totals[month])} for month in numpy.flatnonzero(present)]
+
+    def query9(self, args):
+        mask = self.date_mask(reports.date_arg(args, 'desde'), reports.date_arg(args, 'hasta'))
+        totals = self.totals(self.month[mask], 13, self.amount[mask])
+        present = self.totals(self.month[mask], 13) > 0
+        highest, lowest = extremes(totals, numpy.arange(13), present)
+        row = lambda month: {'mes': int(month), 'monto': money(totals[month])}
+        return self.extremes_rows(highest, lowest, row)
+
+    def query10(self, args):
+        category = args.get('categoria') or reports.DEFAULT_CATEGORY
+        after = reports.int_arg(args, 'despues', 0)
+        limit = reports.int_arg(args, 'limite', None, minimum=1)
+        amounts = self.totals(self.product, self.products.size, self.amount)
+        present = self.totals(self.product, self.products.size) > 0
+        mask = present & numpy.isin(self.product_category, self.categories.codes_by_name(category))
+        mask &= self.products['id'] > after
+        # Los codigos siguen el orden de los ids, asi que el resultado ya queda ordenado por id
+        codes = numpy.flatnonzero(mask)[:limit]
+        return [
+            {'id_producto': int(self.products['id'][code]), 'nombre_producto': self.products['nombre'][code], 'monto_total': money(amounts[code])}
+            for code in codes
+        ]
+
+# Junta los bloques que se insertan durante la carga para armar el modelo al terminar,
+# sin volver a leer la base de datos. Es seguro para la carga en paralelo.
+class ColumnarBuilder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frames = {table: [] for table in TABLE_COLUMNS}
+
+    def append(self, table, df):
+        if table in self.frames:
+            with self.lock:
+                self.frames[table].append(df[TABLE_COLUMNS[table]])
+
+    def build(self):
+        tables = {}
+        for table, columns in TABLE_COLUMNS.items():
+            frames = self.frames[table]
+            tables[table] = pandas.concat(frames, ignore_index=True) if frames else pandas.DataFrame(columns=columns)
+        return ColumnarModel(tables)
+
+# Modelo en memoria vigente. Se descarta mientras se modifican los datos y se reconstruye
+# desde la base de datos la primera vez que se pide si la modificacion no dejo uno nuevo.
+# Guarda la version de los datos compartida con la que se armo: si otro proceso modifico
+# los datos, la version pedida es otra y el modelo se vuelve a armar.
+class ColumnarEngine:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.model = None
+        self.version = None
+        # Modificaciones en curso y cantidad de modificaciones iniciadas
+        self.updating = 0
+        self.generation = 0
+
+    def begin_update(self):
+        with self.lock:
+            self.updating += 1
+            self.generation += 1
+            self.model = None
+
+    # Terminar una modificacion, instalando el modelo que dejo (si lo hay) con su version
+    def end_update(self, model=None, version=None):
+        with self.lock:
+            self.updating -= 1
+            self.model = model if self.updating == 0 else None
+            self.version = version
+
+    # Modelo vigente para la version de datos indicada; sin version se usa el que haya
+    def get(self, build, version=None):
+        with self.lock:
+            model, generation = self.model, self.generation
+            if model is not None and version is not None and self.version != version:
+                model = None
+        if model is not None:
+            return model
+        model = build()
+        # No se guarda si los datos cambiaron mientras se construia
+        with self.lock:
+            if self.updating == 0 and self.generation == generation and (self.model is None or self.version != version):
+                self.model = model
+                self.version = version
+        return model
@@ -0,0 +1,195 @@
+import os
+import time
+import numpy
+import pandas
+import aggregates
+import backends
+import loader
+
+# Carga incremental: recibe solo los CSV con datos nuevos o modificados (un trozo de
+# ordenes.csv y, si hace falta, clientes, productos, etc.) y los aplica sin borrar el modelo.
+# Las ordenes con id mayor a la marca de agua (la ultima orden cargada) se insertan; las que
+# ya existian se comparan con la base de datos y solo se reemplazan si cambiaron. Los resumenes
+# se corrigen solo en las ordenes afectadas, sin recalcular toda la historia.
+
+# Columnas de las dimensiones que, si cambian, alteran los resumenes ya calculados
+AGGREGATE_COLUMNS = {
+    'producto': ['precio', 'categoria_id'],
+    'cliente': ['pais_id']
+}
+
+# Columnas de una linea que se comparan para saber si una orden existente cambio
+LINE_COLUMNS = ['linea_orden', 'cantidad', 'producto_id', 'vendedor_id']
+
+# Ids por cada consulta con IN
+ID_BATCH = 1000
+
+# Candado de MySQL para que dos cargas incrementales no calculen la misma marca de agua.
+# Los motores embebidos no lo necesitan: solo admiten una transaccion de escritura a la vez.
+LOCK_NAME = 'empresa_carga_incremental'
+LOCK_TIMEOUT = 30
+
+# Leer un CSV completo (archivo o ruta) con las columnas y tipos de su tabla
+def read_file(source, file_name, columns):
+    options = {'delimiter': ';', 'usecols': list(columns), 'dtype': loader.CSV_DTYPES[file_name], 'encoding': 'utf-8-sig'}
+    return pandas.read_csv(source, **options).rename(columns=columns)
+
+# Leer los CSV de la entrega. sources es {nombre de archivo: ruta o archivo abierto};
+# devuelve {tabla: DataFrame} y las filas de ordenes.csv en 'ordenes'
+def read_delta(sources):
+    known = {file_name: (table, columns) for table, file_name, columns in loader.SIMPLE_TABLES}
+    frames = {}
+    for file_name, source in sources.items():
+        if file_name == loader.ORDERS_FILE:
+            frames['ordenes'] = read_file(source, file_name, loader.ORDERS_COLUMNS)
+        elif file_name in known:
+            table, columns = known[file_name]
+            frames[table] = read_file(source, file_name, columns)
+        else:
+            raise ValueError(f"Archivo desconocido: {file_name}")
+    return frames
+
+# Archivos de una carpeta que corresponden a las tablas del modelo
+def folder_sources(folder):
+    names = [file_name for _, file_name, _ in loader.SIMPLE_TABLES] + [loader.ORDERS_FILE]
+    sources = {name: os.path.join(folder, name) for name in names if os.path.exists(os.path.join(folder, name))}
+    if not sources:
+        raise ValueError(f"No hay archivos del modelo en la carpeta: {folder}")
+    return sources
+
+# Filas guardadas de una tabla cuyo valor en key esta entre ids
+def existing_rows(cursor, table, key, columns, ids):
+    ids = [int(value) for value in pandas.unique(ids)]
+    rows = []
+    for start in range(0, len(ids), ID_BATCH):
+        batch = ids[start:start + ID_BATCH]
+        cursor.execute(
+            f"SELECT {', '.join([key] + columns)} FROM {table} WHERE {key} IN ({', '.join(['%s'] * len(batch))});",
+            batch
+        )
+        rows.extend(cursor.fetchall())
+    return pandas.DataFrame(rows, columns=[key] + columns)
+
+# Ids de la dimension cuyas columnas que afectan a los resumenes cambian con la entrega
+def changed_dimension_ids(cursor, table, df):
+    columns = AGGREGATE_COLUMNS.get(table)
+    if not columns or not len(df):
+        return []
+    old = existing_rows(cursor, table, 'id', columns, df['id'])
+    merged = df[['id'] + columns].merge(old, on='id', suffixes=('', '_anterior'))
+    changed = numpy.zeros(len(merged), dtype=bool)
+    for column in columns:
+        changed |= merged[column].astype(float).to_numpy() != merged[column + '_anterior'].astype(float).to_numpy()
+    return [int(value) for value in merged.loc[changed, 'id']]
+
+# Consulta con las ordenes ya resumidas (id <= %s) que usan las filas de una dimension
+DIMENSION_ORDERS = {
+    'producto': "SELECT DISTINCT orden_id AS id FROM detalle_orden WHERE orden_id <= %s AND producto_id IN ({ids});",
+    'cliente': "SELECT id FROM orden WHERE id <= %s AND cliente_id IN ({ids});"
+}
+
+# Ordenes ya resumidas cuyas lineas cambian en los resumenes si cambian las filas ids de table
+def dimension_orders(cursor, table, ids, summarized):
+    orders = set()
+    for start in range(0, len(ids), ID_BATCH):
+        batch = ids[start:start + ID_BATCH]
+        cursor.execute(DIMENSION_ORDERS[table].format(ids=', '.join(['%s'] * len(batch))), [summarized] + batch)
+        orders.update(int(row['id']) for row in cursor.fetchall())
+    return orders
+
+# Ids de las ordenes ya cargadas cuyo encabezado o lineas son distintos en la entrega
+def changed_orders(cursor, df_order, df_detail):
+    if not len(df_order):
+        return []
+    header_columns = ['fecha', 'cliente_id']
+    old_order = existing_rows(cursor, 'orden', 'id', header_columns, df_order['id'])
+    old_order['fecha'] = old_order['fecha'].astype(str)
+    new_order = df_order[['id'] + header_columns]
+    headers = new_order.merge(old_order.astype(new_order.dtypes.to_dict()), how='outer', indicator=True)
+    new_lines = df_detail[['orden_id'] + LINE_COLUMNS]
+    old_lines = existing_rows(cursor, 'detalle_orden', 'orden_id', LINE_COLUMNS, df_order['id'])
+    lines = new_lines.merge(old_lines.astype(new_lines.dtypes.to_dict()), how='outer', indicator=True)
+    changed = set(headers.loc[headers['_merge'] != 'both', 'id']) | set(lines.loc[lines['_merge'] != 'both', 'orden_id'])
+    return sorted(int(order_id) for order_id in changed)
+
+# Borrar las lineas de las ordenes que se van a reemplazar
+def delete_lines(cursor, order_ids):
+    for start in range(0, len(order_ids), ID_BATCH):
+        batch = order_ids[start:start + ID_BATCH]
+        cursor.execute(f"DELETE FROM detalle_orden WHERE orden_id IN ({', '.join(['%s'] * len(batch))});", batch)
+
+# Aplicar la entrega y actualizar los resumenes en una sola transaccion. Las ordenes nuevas se
+# suman de forma incremental. Las ordenes ya resumidas que cambian, o que usan un producto o cliente cuyo precio, categoria o
+# pais cambia, se restan de los resumenes antes de aplicar la entrega y se vuelven a sumar despues.
+def load_delta(connection, frames, chunk_size=loader.DEFAULT_CHUNK_SIZE):
+    if chunk_size < 1:
+        raise ValueError("El tamano de lote debe ser mayor que cero")
+    start = time.perf_counter()
+    result = {'dimensiones': [], 'ordenes_nuevas': 0, 'ordenes_modificadas': 0, 'ordenes_sin_cambios': 0, 'lineas': 0}
+    locked = backends.dialect_of(connection) == backends.MYSQL
+    with connection.cursor() as cursor:
+        if locked:
+            cursor.execute("SELECT GET_LOCK(%s, %s) AS bloqueo;", (LOCK_NAME, LOCK_TIMEOUT))
+            if cursor.fetchone()['bloqueo'] != 1:
+                raise ValueError("Otra carga incremental esta en curso")
+        try:
+            # Bloquear la marca de agua de los resumenes hasta el commit, para que otra
+            # actualizacion no resuma ordenes que esta carga esta restando o agregando
+            summarized = aggregates.summarized_order(cursor, lock=locked)
+            watermark = aggregates.last_order(cursor)
+            result['marca_agua_anterior'] = watermark
+            # Ordenes ya resumidas que hay que restar y volver a sumar
+            affected = set()
+            for table in loader.TABLE_DEPENDENCIES:
+                if table in frames and table in DIMENSION_ORDERS:
+                    affected |= dimension_orders(cursor, table, changed_dimension_ids(cursor, table, frames[table]), summarized)
+            changed = []
+            if 'ordenes' in frames:
+                cursor.execute("SELECT COALESCE(MAX(id), 0) AS ultimo_detalle FROM detalle_orden;")
+                splitter = loader.OrderSplitter(cursor.fetchone()['ultimo_detalle'] + 1)
+                df_order, df_detail = splitter.split(frames['ordenes'])
+                old_orders = df_order['id'] <= watermark
+                old_lines = df_detail['orden_id'] <= watermark
+                changed = changed_orders(cursor, df_order[old_orders], df_detail[old_lines])
+                df_order = df_order[~old_orders | df_order['id'].isin(changed)]
+                df_detail = df_detail[~old_lines | df_detail['orden_id'].isin(changed)]
+                affected.update(order_id for order_id in changed if order_id <= summarized)
+            affected = sorted(affected)
+            aggregates.apply_orders(cursor, affected, -1)
+            # Dimensiones en el orden de sus llaves foraneas
+            for table in loader.TABLE_DEPENDENCIES:
+                if table in frames:
+                    rows = loader.upsert_dataframe(cursor, table, frames[table], chunk_size)
+                    result['dimensiones'].append({'tabla': table, 'filas': rows})
+            if 'ordenes' in frames:
+                if changed:
+                    delete_lines(cursor, changed)
+                loader.upsert_dataframe(cursor, 'orden', df_order, chunk_size)
+                result['lineas'] = loader.insert_dataframe(cursor, 'detalle_orden', df_detail, chunk_size)
+                result['ordenes_nuevas'] = int((~old_orders).sum())
+                result['ordenes_modificadas'] = len(changed)
+                result['ordenes_sin_cambios'] = int(old_orders.sum()) - len(changed)
+            aggregates.apply_orders(cursor, affected, 1)
+            aggregates.drop_empty_rows(cursor)
+            # Resumir las ordenes nuevas en la misma transaccion: los lectores nunca ven
+            # ordenes cargadas sin resumir
+            summary_start = time.perf_counter()
+            until = result['marca_agua'] = aggregates.last_order(cursor)
+            if until > summarized:
+                aggregates.apply_range(cursor, summarized, until)
+            result['resumenes'] = {
+                'desde_orden': summarized,
+                'hasta_orden': max(summarized, until),
+                'segundos': round(time.perf_counter() - summary_start, 3)
+            }
+            # Guardar cambios en la base de datos
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            if locked:
+                cursor.execute("SELECT RELEASE_LOCK(%s);", (LOCK_NAME,))
+    result['ordenes_recalculadas'] = len(affected)
+    result['segundos'] = round(time.perf_counter() - start, 3)
+    return result
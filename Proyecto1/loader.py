@@ -0,0 +1,521 @@
+import contextvars
+import itertools
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy
+import pandas
+import backends
+
+# Carpeta con los archivos CSV del modelo
+DATA_DIR = 'Proyecto1/archivos'
+
+# Cantidad de filas enviadas al servidor en cada lote de inserciones
+DEFAULT_CHUNK_SIZE = 5000
+
+# Modos de carga: inserciones por lotes o LOAD DATA LOCAL INFILE
+MODE_BATCH = 'lotes'
+MODE_INFILE = 'infile'
+MODES = (MODE_BATCH, MODE_INFILE)
+
+# Progreso de la carga en paralelo; el resumen de cada tabla se devuelve en las estadisticas
+logger = logging.getLogger('empresa.carga')
+
+# Tablas que se cargan directamente desde un CSV: tabla, archivo y columnas (CSV -> tabla)
+SIMPLE_TABLES = [
+    ('categoria', 'Categorias.csv', {
+        'id_categoria': 'id',
+        'nombre': 'nombre'
+    }),
+    ('producto', 'productos.csv', {
+        'id_producto': 'id',
+        'Nombre': 'nombre',
+        'Precio': 'precio',
+        'id_categoria': 'categoria_id'
+    }),
+    ('pais', 'paises.csv', {
+        'id_pais': 'id',
+        'nombre': 'nombre'
+    }),
+    ('cliente', 'clientes.csv', {
+        'id_cliente': 'id',
+        'Nombre': 'nombre',
+        'Apellido': 'apellido',
+        'Direccion': 'direccion',
+        'Telefono': 'telefono',
+        'Tarjeta': 'tarjeta_credito',
+        'Edad': 'edad',
+        'Salario': 'salario',
+        'Genero': 'genero',
+        'id_pais': 'pais_id'
+    }),
+    ('vendedor', 'vendedores.csv', {
+        'id_vendedor': 'id',
+        'nombre': 'nombre',
+        'id_pais': 'pais_id'
+    })
+]
+
+# Archivo de ordenes, del que salen las tablas orden y detalle_orden
+ORDERS_FILE = 'ordenes.csv'
+ORDERS_COLUMNS = {
+    'id_orden': 'id_orden',
+    'linea_orden': 'linea_orden',
+    'fecha_orden': 'fecha_orden',
+    'id_cliente': 'id_cliente',
+    'id_vendedor': 'id_vendedor',
+    'id_producto': 'id_producto',
+    'cantidad': 'cantidad'
+}
+
+# Tipos explicitos de cada CSV, asi pandas no los infiere en cada bloque
+CSV_DTYPES = {
+    'Categorias.csv': {'id_categoria': 'int64', 'nombre': 'string'},
+    'productos.csv': {'id_producto': 'int64', 'Nombre': 'string', 'Precio': 'float64', 'id_categoria': 'int64'},
+    'paises.csv': {'id_pais': 'int64', 'nombre': 'string'},
+    'clientes.csv': {
+        'id_cliente': 'int64',
+        'Nombre': 'string',
+        'Apellido': 'string',
+        'Direccion': 'string',
+        'Telefono': 'string',
+        'Tarjeta': 'string',
+        'Edad': 'int64',
+        'Salario': 'float64',
+        'Genero': 'string',
+        'id_pais': 'int64'
+    },
+    'vendedores.csv': {'id_vendedor': 'int64', 'nombre': 'string', 'id_pais': 'int64'},
+    'ordenes.csv': {
+        'id_orden': 'int64',
+        'linea_orden': 'int64',
+        'fecha_orden': 'string',
+        'id_cliente': 'int64',
+        'id_vendedor': 'int64',
+        'id_producto': 'int64',
+        'cantidad': 'int64'
+    }
+}
+
+# Llaves foraneas entre las tablas del modelo: cada tabla depende de las que referencia
+TABLE_DEPENDENCIES = {
+    'categoria': [],
+    'pais': [],
+    'producto': ['categoria'],
+    'cliente': ['pais'],
+    'vendedor': ['pais'],
+    'orden': ['cliente'],
+    'detalle_orden': ['orden', 'producto', 'vendedor']
+}
+
+# Hilos (y conexiones) por defecto para la carga en paralelo
+DEFAULT_WORKERS = 4
+
+# Bloques leidos por adelantado mientras se escribe en la base de datos
+PREFETCH_DEPTH = 2
+
+# Marca de fin para la cola de bloques
+END_OF_FILE = object()
+
+# Leer un CSV por bloques de chunk_rows filas (o completo si es None) con las columnas de la tabla
+def read_chunks(file_name, columns, chunk_rows=None):
+    path = os.path.join(DATA_DIR, file_name)
+    # utf-8-sig quita el BOM del primer encabezado (ordenes.csv lo trae)
+    options = {'delimiter': ';', 'usecols': list(columns), 'dtype': CSV_DTYPES[file_name], 'encoding': 'utf-8-sig'}
+    if chunk_rows is None:
+        yield pandas.read_csv(path, **options).rename(columns=columns)
+        return
+    with pandas.read_csv(path, chunksize=chunk_rows, **options) as reader:
+        for chunk in reader:
+            yield chunk.rename(columns=columns)
+
+# Partir una tabla ya leida en bloques de chunk_rows filas (o entregarla completa)
+def frame_chunks(df, chunk_rows=None):
+    step = chunk_rows or max(len(df), 1)
+    for first in range(0, len(df), step):
+        yield df.iloc[first:first + step]
+
+# Leer los bloques en un hilo aparte para solapar el parseo con las escrituras.
+# La cola acotada limita la memoria a PREFETCH_DEPTH bloques en espera.
+def prefetch(chunks, depth=PREFETCH_DEPTH):
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for chunk in chunks:
+                if not put(chunk):
+                    return
+            put(END_OF_FILE)
+        except Exception as e:
+            put(e)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is END_OF_FILE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Detener el hilo lector si la carga termina antes de tiempo
+        stop.set()
+        thread.join()
+
+# Separar el CSV de ordenes en los encabezados de orden y sus lineas de detalle de forma vectorizada.
+# Las lineas de una orden pueden estar desordenadas dentro de un bloque o seguir en el bloque
+# siguiente: se conservan las ordenes del bloque anterior, no todas las vistas, porque en el
+# archivo las lineas de cada orden estan contiguas. Cada linea lleva la fecha de su orden.
+class OrderSplitter:
+    def __init__(self, first_detail_id=1):
+        self.next_detail_id = first_detail_id
+        # Ordenes del bloque anterior y su fecha; la memoria depende del bloque, no del archivo
+        self.open_ids = numpy.empty(0, dtype=numpy.int64)
+        self.open_dates = numpy.empty(0, dtype='datetime64[D]')
+
+    def split(self, df_orders):
+        # Una fila por orden, la primera aparicion de cada id
+        df_order = df_orders.drop_duplicates('id_orden')
+        ids = df_order['id_orden'].to_numpy()
+        if len(ids) and ids.min() < 1:
+            raise ValueError("Los ids de orden deben ser mayores que cero")
+        new_orders = ~numpy.isin(ids, self.open_ids)
+        df_order = df_order[new_orders]
+        # Convertir todas las fechas en una sola pasada
+        dates = pandas.to_datetime(df_order['fecha_orden'], format='%d/%m/%Y').to_numpy().astype('datetime64[D]')
+        df_order = pandas.DataFrame({
+            'id': df_order['id_orden'].to_numpy(),
+            'fecha': numpy.datetime_as_string(dates, unit='D'),
+            'cliente_id': df_order['id_cliente'].to_numpy()
+        })
+        # Fecha de cada orden del bloque (nueva o abierta en el bloque anterior) y de cada linea
+        order_dates = numpy.empty(len(ids), dtype='datetime64[D]')
+        order_dates[new_orders] = dates
+        order_dates[~new_orders] = self.open_dates[pandas.Index(self.open_ids).get_indexer(ids[~new_orders])]
+        self.open_ids, self.open_dates = ids, order_dates
+        positions = pandas.Index(ids).get_indexer(df_orders['id_orden'].to_numpy())
+        # El id del detalle es la posicion de la linea dentro del archivo
+        first_id = self.next_detail_id
+        self.next_detail_id += len(df_orders)
+        df_detail = pandas.DataFrame({
+            'id': numpy.arange(first_id, self.next_detail_id),
+            'linea_orden': df_orders['linea_orden'].to_numpy(),
+            'cantidad': df_orders['cantidad'].to_numpy(),
+            'producto_id': df_orders['id_producto'].to_numpy(),
+            'vendedor_id': df_orders['id_vendedor'].to_numpy(),
+            'orden_id': df_orders['id_orden'].to_numpy(),
+            'fecha': numpy.datetime_as_string(order_dates[positions], unit='D')
+        })
+        return df_order, df_detail
+
+# Insertar un DataFrame en una tabla con el modo de carga indicado y devolver las filas insertadas
+def insert_dataframe(cursor, table, df, chunk_size=DEFAULT_CHUNK_SIZE, mode=MODE_BATCH):
+    if mode == MODE_INFILE:
+        if backends.dialect_of(cursor.connection) != backends.MYSQL:
+            raise ValueError("El modo infile solo esta disponible con MySQL")
+        return load_infile(cursor, table, df)
+    columns = list(df.columns)
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(table, ', '.join(columns), ', '.join(['%s'] * len(columns)))
+    # Convertir a tipos nativos de Python para que pymysql los escape correctamente
+    rows = list(zip(*(df[column].tolist() for column in columns)))
+    # executemany agrupa cada lote en un solo INSERT de multiples filas
+    for start in range(0, len(rows), chunk_size):
+        cursor.executemany(sql, rows[start:start + chunk_size])
+    return len(rows)
+
+# Insertar o actualizar (por llave primaria) las filas de un DataFrame y devolver las filas enviadas
+def upsert_dataframe(cursor, table, df, chunk_size=DEFAULT_CHUNK_SIZE):
+    columns = list(df.columns)
+    updates = backends.upsert_clause(
+        backends.dialect_of(cursor.connection), ['id'], [column for column in columns if column != 'id']
+    )
+    sql = "INSERT INTO {} ({}) VALUES ({}) {}".format(
+        table, ', '.join(columns), ', '.join(['%s'] * len(columns)), updates
+    )
+    rows = list(zip(*(df[column].tolist() for column in columns)))
+    for start in range(0, len(rows), chunk_size):
+        cursor.executemany(sql, rows[start:start + chunk_size])
+    return len(rows)
+
+# Cargar un DataFrame con LOAD DATA LOCAL INFILE a traves de un archivo temporal
+def load_infile(cursor, table, df):
+    columns = list(df.columns)
+    # Los campos con tabulador, comillas o salto de linea van entre comillas (dobladas por dentro);
+    # las barras invertidas se escriben tal cual, por eso el LOAD DATA no usa caracter de escape
+    with tempfile.NamedTemporaryFile('w', suffix='.tsv', delete=False, encoding='utf-8', newline='') as tmp:
+        df.to_csv(tmp, sep='\t', header=False, index=False, lineterminator='\n', quotechar='"', doublequote=True)
+        path = tmp.name
+    try:
+        sql = """
+        LOAD DATA LOCAL INFILE %s INTO TABLE {}
+        CHARACTER SET utf8mb4
+        FIELDS TERMINATED BY '\\t' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+        LINES TERMINATED BY '\\n'
+        ({});
+        """.format(table, ', '.join(columns))
+        cursor.execute(sql, (path,))
+    finally:
+        os.remove(path)
+    return len(df)
+
+# Acumular filas y segundos de una tabla
+def add_stats(stats, table, rows, seconds):
+    entry = stats.setdefault(table, {'tabla': table, 'filas': 0, 'segundos': 0.0})
+    entry['filas'] += rows
+    entry['segundos'] += seconds
+
+# Resumen de la carga de cada tabla
+def summarize_stats(stats):
+    result = []
+    for entry in stats.values():
+        seconds = entry['segundos']
+        result.append({
+            'tabla': entry['tabla'],
+            'filas': entry['filas'],
+            'segundos': round(seconds, 3),
+            'filas_por_segundo': round(entry['filas'] / seconds, 1) if seconds > 0 else None
+        })
+    return result
+
+# Entregar a on_insert cada bloque insertado, para reutilizarlo sin volver a leer la base de datos
+def notify(on_insert, table, df):
+    if on_insert is not None:
+        on_insert(table, df)
+
+# Validar los parametros comunes de la carga
+def check_options(chunk_size, mode, chunk_rows):
+    if mode not in MODES:
+        raise ValueError(f"Modo de carga invalido: {mode}")
+    if chunk_size < 1:
+        raise ValueError("El tamano de lote debe ser mayor que cero")
+    if chunk_rows is not None and chunk_rows < 1:
+        raise ValueError("El tamano de bloque debe ser mayor que cero")
+
+# Cargar todos los CSV al modelo y devolver el tiempo y las filas de cada tabla.
+# Con chunk_rows los archivos se leen por bloques y la memoria no depende de su tamano.
+# on_insert(tabla, df) se llama con cada bloque ya insertado.
+def load_model(connection, chunk_size=DEFAULT_CHUNK_SIZE, mode=MODE_BATCH, chunk_rows=None, on_insert=None):
+    check_options(chunk_size, mode, chunk_rows)
+    stats = {}
+    for table, file_name, columns in SIMPLE_TABLES:
+        start = time.perf_counter()
+        rows = 0
+        with connection.cursor() as cursor:
+            for df in prefetch(read_chunks(file_name, columns, chunk_rows)):
+                rows += insert_dataframe(cursor, table, df, chunk_size, mode)
+                notify(on_insert, table, df)
+        # Guardar cambios en la base de datos
+        connection.commit()
+        add_stats(stats, table, rows, time.perf_counter() - start)
+    # Cargar ordenes y su detalle en la base de datos
+    splitter = OrderSplitter()
+    with connection.cursor() as cursor:
+        start = time.perf_counter()
+        for df_orders in prefetch(read_chunks(ORDERS_FILE, ORDERS_COLUMNS, chunk_rows)):
+            df_order, df_detail = splitter.split(df_orders)
+            rows = insert_dataframe(cursor, 'orden', df_order, chunk_size, mode)
+            notify(on_insert, 'orden', df_order)
+            add_stats(stats, 'orden', rows, time.perf_counter() - start)
+            start = time.perf_counter()
+            rows = insert_dataframe(cursor, 'detalle_orden', df_detail, chunk_size, mode)
+            notify(on_insert, 'detalle_orden', df_detail)
+            add_stats(stats, 'detalle_orden', rows, time.perf_counter() - start)
+            start = time.perf_counter()
+    # Guardar cambios en la base de datos
+    connection.commit()
+    return summarize_stats(stats)
+
+# Cargar tablas ya normalizadas {tabla: DataFrame}, por ejemplo de una instantanea, en el orden
+# de sus llaves foraneas. Cada tabla se envia por bloques de chunk_rows filas (o completa).
+def load_tables(connection, tables, chunk_size=DEFAULT_CHUNK_SIZE, mode=MODE_BATCH, chunk_rows=None, on_insert=None):
+    check_options(chunk_size, mode, chunk_rows)
+    stats = {}
+    for table in TABLE_DEPENDENCIES:
+        df = tables[table]
+        start = time.perf_counter()
+        with connection.cursor() as cursor:
+            for block in frame_chunks(df, chunk_rows):
+                insert_dataframe(cursor, table, block, chunk_size, mode)
+                notify(on_insert, table, block)
+        # Guardar cambios en la base de datos
+        connection.commit()
+        add_stats(stats, table, len(df), time.perf_counter() - start)
+    return summarize_stats(stats)
+
+# Enviar una tarea a un pool de hilos con una copia del contexto de quien la envia, asi las
+# sentencias SQL de los hilos conservan la operacion con la que las etiqueta metrics
+def submit(executor, function, *args):
+    return executor.submit(contextvars.copy_context().run, function, *args)
+
+# Ejecutar tareas con dependencias en un pool de hilos. tasks es {nombre: (dependencias, funcion)};
+# cada tarea se lanza en cuanto terminan todas sus dependencias. Devuelve el resultado de cada tarea.
+def run_tasks(tasks, workers):
+    results = {}
+    pending = dict(tasks)
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            ready = [name for name, (dependencies, _) in pending.items() if all(d in results for d in dependencies)]
+            for name in ready:
+                dependencies, function = pending.pop(name)
+                running[submit(executor, function)] = name
+            if not running:
+                raise ValueError(f"Dependencias sin resolver: {', '.join(pending)}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                # Si una tarea falla se propaga el error y no se lanzan las pendientes
+                results[name] = future.result()
+    return results
+
+# Cargar el modelo en paralelo con una conexion por hilo. Las tablas sin dependencias entre si
+# se cargan a la vez. ordenes.csv se parsea por bloques desde el inicio, en un hilo aparte y
+# con la cola acotada de prefetch; cuando ya estan cliente, producto y vendedor, cada bloque
+# inserta sus ordenes y reparte sus lineas de detalle_orden en rangos entre los hilos, con a lo
+# mas dos bloques de lineas en vuelo. Con tables ({tabla: DataFrame}, por ejemplo de
+# staging.stage_model) no se leen los CSV.
+def load_model_parallel(connect, workers=DEFAULT_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE, mode=MODE_BATCH, chunk_rows=None, on_insert=None, tables=None):
+    check_options(chunk_size, mode, chunk_rows)
+    if workers < 1:
+        raise ValueError("La cantidad de hilos debe ser mayor que cero")
+    lock = threading.Lock()
+    # Conexiones libres: cada tarea toma una y la devuelve, asi hay a lo mas una por tarea en curso
+    idle = queue.SimpleQueue()
+    connections = []
+    # Filas e intervalo de tiempo (inicio, fin) de cada tabla
+    spans = {}
+    parsed = {}
+
+    def get_connection():
+        try:
+            return idle.get_nowait()
+        except queue.Empty:
+            connection = connect()
+            with lock:
+                connections.append(connection)
+            return connection
+
+    def run(table, load):
+        connection = get_connection()
+        start = time.perf_counter()
+        try:
+            with connection.cursor() as cursor:
+                rows = load(cursor)
+            # Guardar cambios en la base de datos
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            idle.put(connection)
+        end = time.perf_counter()
+        with lock:
+            span = spans.setdefault(table, [0, start, end])
+            span[0] += rows
+            span[1] = min(span[1], start)
+            span[2] = max(span[2], end)
+            total_rows, first_start, last_end = span
+            seconds = last_end - first_start
+            # Progreso de la tabla con su rendimiento acumulado
+            logger.info("Carga %s: %d filas en %.3f s (%.1f filas/s)", table, total_rows, seconds, total_rows / seconds if seconds > 0 else 0)
+        return rows
+
+    def insert(table, df):
+        def load(cursor):
+            rows = insert_dataframe(cursor, table, df, chunk_size, mode)
+            notify(on_insert, table, df)
+            return rows
+        return run(table, load)
+
+    def simple_task(table, file_name, columns):
+        def load(cursor):
+            rows = 0
+            if tables is None:
+                chunks = prefetch(read_chunks(file_name, columns, chunk_rows))
+            else:
+                chunks = frame_chunks(tables[table], chunk_rows)
+            for df in chunks:
+                rows += insert_dataframe(cursor, table, df, chunk_size, mode)
+                notify(on_insert, table, df)
+            return rows
+        return lambda: run(table, load)
+
+    # Bloques (orden, detalle_orden) de ordenes.csv, parseados en el hilo de prefetch
+    def split_orders():
+        splitter = OrderSplitter()
+        for df_orders in read_chunks(ORDERS_FILE, ORDERS_COLUMNS, chunk_rows):
+            yield splitter.split(df_orders)
+
+    # Empezar a parsear ordenes.csv mientras se cargan las dimensiones: el primer bloque se pide
+    # aqui y el hilo de prefetch sigue con los siguientes hasta llenar su cola
+    def parse_orders():
+        if tables is not None:
+            parsed['bloques'] = iter([(tables['orden'], tables['detalle_orden'])])
+            return
+        parsed['lector'] = prefetch(split_orders())
+        first = next(parsed['lector'], None)
+        parsed['bloques'] = itertools.chain([] if first is None else [first], parsed['lector'])
+
+    # Insertar las ordenes de cada bloque y repartir sus lineas entre los hilos del detalle.
+    # Las lineas se insertan despues de sus ordenes, que ya quedaron guardadas.
+    def orders_task():
+        detail_workers = max(workers - 1, 1)
+        pending = set()
+        with ThreadPoolExecutor(max_workers=detail_workers) as executor:
+            try:
+                for df_order, df_detail in parsed['bloques']:
+                    insert('orden', df_order)
+                    for index in range(detail_workers):
+                        first = len(df_detail) * index // detail_workers
+                        last = len(df_detail) * (index + 1) // detail_workers
+                        if last > first:
+                            pending.add(submit(executor, insert, 'detalle_orden', df_detail.iloc[first:last]))
+                    # Esperar mientras haya mas de un bloque de lineas en vuelo
+                    while len(pending) > detail_workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                for future in pending:
+                    future.result()
+            except Exception:
+                for future in pending:
+                    future.cancel()
+                raise
+
+    tasks = {}
+    for table, file_name, columns in SIMPLE_TABLES:
+        tasks[table] = (TABLE_DEPENDENCIES[table], simple_task(table, file_name, columns))
+    tasks[ORDERS_FILE] = ([], parse_orders)
+    # Las ordenes y sus lineas esperan a todas las tablas que referencian
+    dependencies = TABLE_DEPENDENCIES['orden'] + [table for table in TABLE_DEPENDENCIES['detalle_orden'] if table != 'orden']
+    tasks['orden'] = (dependencies + [ORDERS_FILE], orders_task)
+    try:
+        run_tasks(tasks, workers)
+    finally:
+        # Detener el hilo de prefetch si la carga termina antes de tiempo
+        if 'lector' in parsed:
+            parsed['lector'].close()
+        for connection in connections:
+            connection.close()
+    stats = {}
+    for table in TABLE_DEPENDENCIES:
+        if table in spans:
+            rows, start, end = spans[table]
+            add_stats(stats, table, rows, end - start)
+    return summarize_stats(stats)
@@ -0,0 +1,209 @@
+import collections
+import contextlib
+import contextvars
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+import pymysql
+import backends
+
+# Metricas de la API en formato de texto de Prometheus: tiempo y filas de cada sentencia SQL,
+# espera por una conexion del pool, duracion de las peticiones y de cada fase de la carga.
+# Incluye un registro opcional de sentencias lentas con su plan de EXPLAIN.
+
+# Limites (en segundos) de los histogramas de tiempo
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Limites de los histogramas de filas
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+# Sentencias lentas que se conservan en memoria
+SLOW_QUERY_ENTRIES = 100
+
+# Caracteres de cada sentencia lenta que se guardan (un INSERT por lotes puede ser enorme)
+SLOW_QUERY_TEXT = 2000
+
+# Operacion (ruta de la API) a la que se atribuyen las sentencias del hilo actual
+operation = contextvars.ContextVar('operacion', default='otro')
+
+# Valor de una etiqueta escapado para el formato de texto
+def label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values, extra=None):
+    pairs = [f'{name}="{label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+# Histograma con etiquetas, seguro para hilos
+class Histogram:
+    def __init__(self, name, description, labels=(), buckets=TIME_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.lock = threading.Lock()
+        # Por cada combinacion de etiquetas: conteo por limite, suma y total
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self.lock:
+            counts, total = self.series.setdefault(key, ([0] * len(self.buckets), [0.0, 0]))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            total[0] += value
+            total[1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = [(key, list(counts), list(total)) for key, (counts, total) in sorted(self.series.items())]
+        for key, counts, (value_sum, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bound_label = 'le="' + format_bound(bound) + '"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, key, bound_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {value_sum}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def histogram(self, name, description, labels=(), buckets=TIME_BUCKETS):
+        metric = Histogram(name, description, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+query_seconds = registry.histogram(
+    'empresa_sql_segundos', 'Tiempo de ejecucion de cada sentencia SQL', ('operacion', 'sentencia')
+)
+query_rows = registry.histogram(
+    'empresa_sql_filas', 'Filas devueltas o afectadas por cada sentencia SQL', ('operacion', 'sentencia'), ROW_BUCKETS
+)
+pool_wait_seconds = registry.histogram(
+    'empresa_pool_espera_segundos', 'Tiempo de espera para obtener una conexion del pool'
+)
+request_seconds = registry.histogram(
+    'empresa_peticion_segundos', 'Duracion de cada peticion a la API', ('ruta', 'estado')
+)
+load_seconds = registry.histogram(
+    'empresa_carga_segundos', 'Duracion de cada fase de la carga del modelo', ('fase', 'tabla')
+)
+load_rows = registry.histogram(
+    'empresa_carga_filas', 'Filas cargadas en cada tabla', ('tabla',), ROW_BUCKETS
+)
+
+# Tipo de sentencia (SELECT, INSERT, ...) para etiquetar sin usar el texto completo
+def statement_kind(query):
+    words = query.split(None, 1) if isinstance(query, str) else []
+    return words[0].upper() if words else 'OTRA'
+
+# Registro de sentencias lentas. Las que superan threshold segundos se escriben en el log
+# 'empresa.consultas_lentas' y se guardan las ultimas en memoria; las SELECT van con su EXPLAIN.
+class SlowQueryLog:
+    def __init__(self, threshold=None, max_entries=SLOW_QUERY_ENTRIES):
+        self.threshold = threshold
+        self.entries = collections.deque(maxlen=max_entries)
+        self.logger = logging.getLogger('empresa.consultas_lentas')
+
+    def record(self, cursor, query, args, seconds):
+        if self.threshold is None or seconds < self.threshold:
+            return
+        entry = {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'operacion': operation.get(),
+            'segundos': round(seconds, 6),
+            'sentencia': str(query)[:SLOW_QUERY_TEXT],
+            'parametros': args if args is None or isinstance(args, (list, tuple, dict)) else str(args),
+            'plan': self.explain(cursor, query, args)
+        }
+        self.entries.append(entry)
+        self.logger.warning(json.dumps(entry, default=str))
+
+    # EXPLAIN de una SELECT con un cursor aparte; con un cursor sin buffer la conexion
+    # sigue ocupada leyendo el resultado y no se puede. Solo con MySQL: en los motores
+    # embebidos el cursor aparte comparte la sentencia en curso.
+    @staticmethod
+    def explain(cursor, query, args):
+        if statement_kind(query) not in ('SELECT', 'WITH') or isinstance(cursor, pymysql.cursors.SSCursor):
+            return None
+        if backends.dialect_of(cursor.connection) != backends.MYSQL:
+            return None
+        try:
+            with cursor.connection.cursor(pymysql.cursors.DictCursor) as explain_cursor:
+                explain_cursor.execute("EXPLAIN " + query, args)
+                return explain_cursor.fetchall()
+        except Exception as e:
+            return f"Error: {str(e)}"
+
+    def recent(self):
+        return list(self.entries)
+
+slow_queries = SlowQueryLog()
+
+# Medir cada execute de un cursor de pymysql. executemany de pymysql termina llamando a
+# execute con cada INSERT de varias filas, asi que tambien queda medido.
+class InstrumentedCursorMixin:
+    def execute(self, query, args=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, args)
+        finally:
+            self.observe(query, args, time.perf_counter() - start)
+
+    def observe(self, query, args, seconds):
+        labels = {'operacion': operation.get(), 'sentencia': statement_kind(query)}
+        query_seconds.observe(seconds, **labels)
+        # Con un cursor sin buffer las filas aun no se conocen
+        if not isinstance(self, pymysql.cursors.SSCursor) and self.rowcount is not None and self.rowcount >= 0:
+            query_rows.observe(self.rowcount, **labels)
+        slow_queries.record(self, query, args, seconds)
+
+class InstrumentedDictCursor(InstrumentedCursorMixin, pymysql.cursors.DictCursor):
+    pass
+
+class InstrumentedSSDictCursor(InstrumentedCursorMixin, pymysql.cursors.SSDictCursor):
+    pass
+
+# En los motores embebidos executemany no pasa por execute y se mide aparte
+class InstrumentedEmbeddedCursor(InstrumentedCursorMixin, backends.EmbeddedCursor):
+    def executemany(self, query, args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, args)
+        finally:
+            self.observe(query, None, time.perf_counter() - start)
+
+# Registrar las filas y la duracion de cada tabla de una carga (la salida de loader.summarize_stats)
+def observe_load(tables):
+    for entry in tables:
+        load_seconds.observe(entry['segundos'], fase='tabla', tabla=entry['tabla'])
+        load_rows.observe(entry['filas'], tabla=entry['tabla'])
+
+# Medir una fase de la carga (lectura e insercion, resumenes, restricciones, ...)
+@contextlib.contextmanager
+def load_phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        load_seconds.observe(time.perf_counter() - start, fase=name, tabla='')
@@ -0,0 +1,144 @@
+import collections
+import contextlib
+import threading
+import time
+import pymysql
+
+# Errores que dejan la conexion inutilizable y obligan a descartarla
+FATAL_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+
+# Error cuando no hay conexiones libres dentro del tiempo de espera
+class PoolTimeoutError(Exception):
+    pass
+
+# Pool de conexiones seguro para hilos. Mantiene al menos min_size conexiones abiertas,
+# nunca mas de max_size, y revisa con ping las que llevan tiempo sin usarse.
+# on_wait(segundos), si se indica, recibe lo que tardo cada peticion en obtener su conexion.
+class ConnectionPool:
+    def __init__(self, connect, min_size=2, max_size=10, timeout=30, ping_interval=30, on_wait=None):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Tamanos de pool invalidos")
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self.on_wait = on_wait
+        self.condition = threading.Condition()
+        # Conexiones libres con el momento en que se devolvieron
+        self.idle = collections.deque()
+        # Conexiones abiertas, libres o prestadas
+        self.size = 0
+        self.closed = False
+        for _ in range(min_size):
+            self.idle.append((connect(), time.monotonic()))
+            self.size += 1
+
+    # Tomar una conexion del pool, abriendo una nueva si hay espacio o esperando si no
+    def acquire(self):
+        start = time.monotonic()
+        connection = self.take(start + self.timeout)
+        if self.on_wait is not None:
+            self.on_wait(time.monotonic() - start)
+        return connection
+
+    def take(self, deadline):
+        with self.condition:
+            while True:
+                if self.closed:
+                    raise PoolTimeoutError("El pool de conexiones esta cerrado")
+                if self.idle:
+                    connection, last_used = self.idle.pop()
+                    break
+                if self.size < self.max_size:
+                    self.size += 1
+                    connection, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(f"No hay conexiones libres despues de {self.timeout} s")
+                self.condition.wait(remaining)
+        if connection is None:
+            return self.open()
+        if time.monotonic() - last_used >= self.ping_interval:
+            return self.check(connection)
+        return connection
+
+    # Abrir una conexion nueva para un espacio ya reservado en el pool
+    def open(self):
+        try:
+            return self.connect()
+        except Exception:
+            self.discard()
+            raise
+
+    # Revisar una conexion inactiva y reconectarla si el servidor la cerro
+    def check(self, connection):
+        try:
+            connection.ping(reconnect=True)
+            return connection
+        except Exception:
+            self.close_quietly(connection)
+            return self.open()
+
+    # Devolver una conexion al pool. Se deshace la transaccion abierta para que la siguiente
+    # peticion no herede bloqueos ni una vista vieja de los datos.
+    def release(self, connection, broken=False):
+        if not broken:
+            try:
+                connection.rollback()
+            except Exception:
+                broken = True
+        if broken:
+            self.close_quietly(connection)
+            self.discard()
+            return
+        with self.condition:
+            if self.closed:
+                self.size -= 1
+                self.close_quietly(connection)
+            else:
+                self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+
+    # Liberar el espacio de una conexion descartada
+    def discard(self):
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    @staticmethod
+    def close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    # Prestar una conexion durante un bloque with. Si falla la comunicacion con el servidor
+    # la conexion se descarta en lugar de volver al pool.
+    @contextlib.contextmanager
+    def connection(self):
+        connection = self.acquire()
+        broken = False
+        try:
+            yield connection
+        except FATAL_ERRORS:
+            broken = True
+            raise
+        finally:
+            self.release(connection, broken)
+
+    # Cerrar todas las conexiones libres; las prestadas se cierran al devolverse
+    def close(self):
+        with self.condition:
+            self.closed = True
+            while self.idle:
+                connection, _ = self.idle.pop()
+                self.size -= 1
+                self.close_quietly(connection)
+            self.condition.notify_all()
+
+    # Estado del pool
+    def stats(self):
+        with self.condition:
+            return {'abiertas': self.size, 'libres': len(self.idle), 'min': self.min_size, 'max': self.max_size}
@@ -0,0 +1,344 @@
+from datetime import date
+
+# Consultas SQL de los reportes /consulta1 a /consulta10
+
+# Valores por defecto de los reportes parametrizados
+DEFAULT_TOP_COUNTRIES = 5
+DEFAULT_COUNTRY = 'Inglaterra'
+DEFAULT_CATEGORY = 'Deportes'
+
+# Columnas auxiliares con la posicion de cada fila en los extremos
+MAX_POSITION = 'posicion_max'
+MIN_POSITION = 'posicion_min'
+
+# Envolver una agregacion para obtener en una sola pasada sus filas con el mayor y el menor
+# valor de metric. Los empates se resuelven por key para que el resultado sea determinista.
+# Devuelve una o dos filas; usar split_extremes para separarlas.
+def extremes_query(aggregate, metric, key):
+    return f"""
+WITH agregado AS ({aggregate}),
+extremos AS (
+    SELECT agregado.*,
+        ROW_NUMBER() OVER (ORDER BY {metric} DESC, {key} ASC) AS {MAX_POSITION},
+        ROW_NUMBER() OVER (ORDER BY {metric} ASC, {key} ASC) AS {MIN_POSITION}
+    FROM agregado
+)
+SELECT * FROM extremos
+WHERE {MAX_POSITION} = 1 OR {MIN_POSITION} = 1;
+"""
+
+# Separar las filas de extremes_query en (fila maxima, fila minima), sin las columnas auxiliares.
+# Si solo hay un grupo la misma fila es maximo y minimo; si no hay datos devuelve (None, None).
+def split_extremes(rows):
+    highest = lowest = None
+    for row in rows:
+        clean = {column: value for column, value in row.items() if column not in (MAX_POSITION, MIN_POSITION)}
+        if row[MAX_POSITION] == 1:
+            highest = clean
+        if row[MIN_POSITION] == 1:
+            lowest = clean
+    return highest, lowest
+
+# Lista con el maximo y el minimo, sin repetir la fila si coinciden (como hacia UNION)
+def extremes_list(rows):
+    highest, lowest = split_extremes(rows)
+    if highest is None:
+        return []
+    return [highest] if lowest == highest else [highest, lowest]
+
+# Obtener las N filas con mayor metric dentro de cada grupo de una agregacion, numeradas con
+# ROW_NUMBER() y desempatadas por key. N se pasa como parametro (%s) al ejecutar la consulta.
+def top_n_per_group_query(aggregate, columns, group, metric, key):
+    return f"""
+WITH agregado AS ({aggregate}),
+ranking AS (
+    SELECT agregado.*,
+        ROW_NUMBER() OVER (PARTITION BY {group} ORDER BY {metric} DESC, {key} ASC) AS posicion
+    FROM agregado
+)
+SELECT {', '.join(columns)} FROM ranking
+WHERE posicion <= %s
+ORDER BY {group}, posicion;
+"""
+
+# Mostrar el cliente que mas ha comprado. Se debe de mostrar el id del cliente, nombre, apellido, pais y monto total.
+QUERY1 = """
+SELECT cliente.id AS id_cliente,
+    cliente.nombre AS nombre_cliente,
+    cliente.apellido AS apellido_cliente,
+    pais.nombre AS pais_cliente,
+    resumen_cliente.monto_total AS monto_total
+FROM resumen_cliente
+JOIN cliente ON resumen_cliente.cliente_id = cliente.id
+JOIN pais ON cliente.pais_id = pais.id
+ORDER BY monto_total DESC
+LIMIT 1;
+"""
+
+# Mostrar el producto mas y menos comprado. Se debe mostrar el id del producto, nombre del producto, categoria, cantidad de unidades y monto vendido.
+QUERY2 = extremes_query("""
+SELECT producto.id AS id_producto,
+    producto.nombre AS nombre_producto,
+    categoria.nombre AS categoria_producto,
+    resumen_producto.cantidad_unidades AS cantidad_unidades,
+    resumen_producto.monto_vendido AS monto_vendido
+FROM resumen_producto
+JOIN producto ON resumen_producto.producto_id = producto.id
+JOIN categoria ON producto.categoria_id = categoria.id
+""", 'cantidad_unidades', 'id_producto')
+
+# Mostrar a la persona que mas ha vendido. Se debe mostrar el id del vendedor, nombre del vendedor, monto total vendido.
+QUERY3 = """
+SELECT vendedor.id AS id_vendedor,
+    vendedor.nombre AS nombre_vendedor,
+    resumen_vendedor.monto_total AS monto_total_vendido
+FROM resumen_vendedor
+JOIN vendedor ON resumen_vendedor.vendedor_id = vendedor.id
+ORDER BY monto_total_vendido DESC
+LIMIT 1;
+"""
+
+# Mostrar el país que mas y menos ha vendido. Debe mostrar el nombre del pais y el monto. (Una sola consulta).
+QUERY4 = extremes_query("""
+SELECT pais.nombre AS nombre_pais,
+    SUM(resumen_vendedor.monto_total) AS monto_total_vendido
+FROM resumen_vendedor
+INNER JOIN vendedor ON resumen_vendedor.vendedor_id = vendedor.id
+INNER JOIN pais ON vendedor.pais_id = pais.id
+GROUP BY pais.nombre
+""", 'monto_total_vendido', 'nombre_pais')
+
+# Top 5 de paises que mas han comprado en orden ascendente. Se le solicita mostrar el id del pais, nombre y monto total.
+# La cantidad de paises es un parametro (por defecto 5).
+QUERY5 = """
+SELECT pais.id AS id_pais,
+    pais.nombre AS nombre_pais,
+    SUM(resumen_pais_mes.monto_total) AS monto_total_comprado
+FROM resumen_pais_mes
+JOIN pais ON resumen_pais_mes.pais_id = pais.id
+GROUP BY pais.id, pais.nombre
+ORDER BY monto_total_comprado ASC
+LIMIT %s;
+"""
+
+def query5(n=DEFAULT_TOP_COUNTRIES):
+    return QUERY5, (n,)
+
+# Mostrar la categoria que mas y menos se ha comprado. Debe de mostrar el nombre de la categoria y cantidad de unidades. (Una sola consulta).
+QUERY6 = extremes_query("""
+SELECT categoria.nombre AS nombre_categoria,
+    SUM(resumen_pais_categoria.cantidad_unidades) AS cantidad_total
+FROM resumen_pais_categoria
+INNER JOIN categoria ON resumen_pais_categoria.categoria_id = categoria.id
+GROUP BY categoria.nombre
+""", 'cantidad_total', 'nombre_categoria')
+
+# Mostrar la categoria mas comprada por cada país. Se debe de mostrar el nombre del pais, nombre de la categoria y cantidad de unidades.
+# Unidades por pais del cliente y categoria
+COUNTRY_CATEGORY_UNITS = """
+SELECT pais.nombre AS pais,
+    categoria.nombre AS categoría,
+    resumen_pais_categoria.cantidad_unidades AS cantidad_unidades
+FROM resumen_pais_categoria
+JOIN categoria ON resumen_pais_categoria.categoria_id = categoria.id
+JOIN pais ON resumen_pais_categoria.pais_id = pais.id
+"""
+COUNTRY_CATEGORY_COLUMNS = ['pais', 'categoría', 'cantidad_unidades']
+
+# Dimension de agrupacion de la consulta 7: top N de categorias por pais o de paises por categoria
+QUERY7_BY = {
+    'pais': top_n_per_group_query(COUNTRY_CATEGORY_UNITS, COUNTRY_CATEGORY_COLUMNS, 'pais', 'cantidad_unidades', 'categoría'),
+    'categoria': top_n_per_group_query(COUNTRY_CATEGORY_UNITS, COUNTRY_CATEGORY_COLUMNS, 'categoría', 'cantidad_unidades', 'pais')
+}
+QUERY7 = QUERY7_BY['pais']
+
+# Mostrar las ventas por mes de Inglaterra. Debe de mostrar el numero del mes y el monto.
+# El pais es un parametro (por defecto Inglaterra).
+QUERY8 = """
+SELECT resumen_pais_mes.mes AS numero_mes,
+SUM(resumen_pais_mes.monto_total) AS monto_total
+FROM resumen_pais_mes
+JOIN pais ON resumen_pais_mes.pais_id = pais.id
+WHERE pais.nombre = %s
+GROUP BY resumen_pais_mes.mes
+ORDER BY numero_mes;
+"""
+
+# Con un rango de fechas el resumen mensual no alcanza y se agregan las lineas del rango.
+# El filtro va sobre detalle_orden.fecha (la fecha de la orden copiada en cada linea): recorre
+# solo las lineas del rango por su indice y, si la tabla esta particionada, solo sus particiones.
+QUERY8_RANGE = """
+SELECT detalle_orden.mes AS numero_mes,
+SUM(detalle_orden.monto) AS monto_total
+FROM detalle_orden
+JOIN orden ON detalle_orden.orden_id = orden.id
+JOIN cliente ON orden.cliente_id = cliente.id
+JOIN pais ON cliente.pais_id = pais.id
+WHERE {}
+GROUP BY detalle_orden.mes
+ORDER BY numero_mes;
+"""
+
+# Condiciones de un rango de fechas (inclusive) sobre detalle_orden.fecha y sus parametros
+def date_range(since, until):
+    conditions = []
+    params = []
+    if since is not None:
+        conditions.append('detalle_orden.fecha >= %s')
+        params.append(since)
+    if until is not None:
+        conditions.append('detalle_orden.fecha <= %s')
+        params.append(until)
+    return conditions, params
+
+# Ventas por mes de un pais, opcionalmente entre dos fechas (inclusive)
+def query8(country=DEFAULT_COUNTRY, since=None, until=None):
+    if since is None and until is None:
+        return QUERY8, (country,)
+    conditions, params = date_range(since, until)
+    return QUERY8_RANGE.format(' AND '.join(['pais.nombre = %s'] + conditions)), tuple([country] + params)
+
+# Mostrar el mes con mas y menos ventas. Se debe de mostrar el numero de mes y monto. (Una sola consulta).
+QUERY9 = extremes_query("""
+SELECT resumen_pais_mes.mes AS mes,
+    SUM(resumen_pais_mes.monto_total) AS monto
+FROM resumen_pais_mes
+GROUP BY resumen_pais_mes.mes
+""", 'monto', 'mes')
+
+# Meses con mas y menos ventas entre dos fechas (inclusive), sobre las lineas del rango
+QUERY9_RANGE = """
+SELECT detalle_orden.mes AS mes,
+    SUM(detalle_orden.monto) AS monto
+FROM detalle_orden
+WHERE {}
+GROUP BY detalle_orden.mes
+"""
+
+def query9(since=None, until=None):
+    if since is None and until is None:
+        return QUERY9, None
+    conditions, params = date_range(since, until)
+    return extremes_query(QUERY9_RANGE.format(' AND '.join(conditions)), 'monto', 'mes'), tuple(params)
+
+# Mostrar las ventas de cada producto de la categoria deportes. Se debe de mostrar el id del producto, nombre y monto.
+# La categoria es un parametro (por defecto Deportes) y el resultado se pagina por id de producto:
+# cada pagina empieza despues del ultimo id de la anterior.
+QUERY10 = """
+SELECT producto.id AS id_producto,
+    producto.nombre AS nombre_producto,
+    resumen_producto.monto_vendido AS monto_total
+FROM resumen_producto
+JOIN producto ON resumen_producto.producto_id = producto.id
+JOIN categoria ON producto.categoria_id = categoria.id
+WHERE categoria.nombre = %s AND producto.id > %s
+ORDER BY producto.id{};
+"""
+
+def query10(category=DEFAULT_CATEGORY, after=0, limit=None):
+    if limit is None:
+        return QUERY10.format(''), (category, after)
+    return QUERY10.format('\nLIMIT %s'), (category, after, limit)
+
+# Leer un parametro entero de la URL (args es request.args o un dict)
+def int_arg(args, name, default, minimum=None):
+    value = args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"Parametro {name} invalido: {value}")
+    if minimum is not None and value < minimum:
+        raise ValueError(f"{name} debe ser mayor o igual a {minimum}")
+    return value
+
+# Leer un parametro de fecha AAAA-MM-DD de la URL
+def date_arg(args, name):
+    value = args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Fecha invalida: {value}")
+
+# Formas de respuesta de los reportes a partir de sus filas
+def first_row(rows):
+    return rows[0] if rows else None
+
+def product_extremes(rows):
+    highest, lowest = split_extremes(rows)
+    return {'producto_mas_comprado': highest, 'producto_menos_comprado': lowest}
+
+def category_extremes(rows):
+    return {'categoria_mas_comprada': extremes_list(rows)}
+
+# Plan de cada reporte: a partir de los parametros de la URL devuelve (consulta, parametros, forma).
+# forma convierte las filas en la respuesta; si es None la respuesta es la lista de filas
+# y puede enviarse por partes.
+def plan_query1(args):
+    return QUERY1, None, first_row
+
+def plan_query2(args):
+    return QUERY2, None, product_extremes
+
+def plan_query3(args):
+    return QUERY3, None, first_row
+
+def plan_query4(args):
+    return QUERY4, None, extremes_list
+
+def plan_query5(args):
+    n = int_arg(args, 'n', DEFAULT_TOP_COUNTRIES, minimum=1)
+    query, params = query5(n)
+    return query, params, None
+
+def plan_query6(args):
+    return QUERY6, None, category_extremes
+
+def plan_query7(args):
+    n = int_arg(args, 'n', 1, minimum=1)
+    dimension = args.get('por') or 'pais'
+    if dimension not in QUERY7_BY:
+        raise ValueError(f"Dimension invalida: {dimension}")
+    return QUERY7_BY[dimension], (n,), None
+
+def plan_query8(args):
+    country = args.get('pais') or DEFAULT_COUNTRY
+    query, params = query8(country, date_arg(args, 'desde'), date_arg(args, 'hasta'))
+    return query, params, None
+
+def plan_query9(args):
+    query, params = query9(date_arg(args, 'desde'), date_arg(args, 'hasta'))
+    return query, params, extremes_list
+
+def plan_query10(args):
+    category = args.get('categoria') or DEFAULT_CATEGORY
+    after = int_arg(args, 'despues', 0)
+    limit = int_arg(args, 'limite', None, minimum=1)
+    query, params = query10(category, after, limit)
+    return query, params, None
+
+REPORT_PLANS = {
+    'consulta1': plan_query1,
+    'consulta2': plan_query2,
+    'consulta3': plan_query3,
+    'consulta4': plan_query4,
+    'consulta5': plan_query5,
+    'consulta6': plan_query6,
+    'consulta7': plan_query7,
+    'consulta8': plan_query8,
+    'consulta9': plan_query9,
+    'consulta10': plan_query10
+}
+
+def report_plan(name, args):
+    return REPORT_PLANS[name](args)
+
+# Convertir las filas de un reporte en su respuesta
+def shape_rows(rows, shape):
+    return list(rows) if shape is None else shape(rows)
+
+# Consultas (con sus parametros por defecto) que ejecuta cada reporte
+REPORT_QUERIES = {name: [plan({})[:2]] for name, plan in REPORT_PLANS.items()}
@@ -0,0 +1,273 @@
+from datetime import date
+import re
+import time
+import advisor
+import aggregates
+import backends
+
+# Definicion del modelo y operaciones rapidas sobre el esquema. Las llaves foraneas se crean
+# aparte de las tablas para poder diferirlas (junto con los indices secundarios) hasta
+# despues de la carga masiva, fuera del camino critico de la insercion.
+
+# Tablas del modelo en orden de creacion (cada una despues de las que referencia)
+MODEL_TABLES = ['categoria', 'producto', 'pais', 'cliente', 'vendedor', 'orden', 'detalle_orden']
+
+# Base de datos del modelo en MySQL si no se indica otra
+DEFAULT_DATABASE = 'empresa'
+
+# Recrear la base de datos indicada (solo MySQL). El nombre va dentro de la sentencia, asi
+# que solo se aceptan letras, numeros y guion bajo.
+def database_ddl(database=DEFAULT_DATABASE):
+    if not re.fullmatch(r'\w+', database):
+        raise ValueError(f"Nombre de base de datos invalido: {database}")
+    return [
+        f"DROP DATABASE IF EXISTS {database};",
+        f"CREATE DATABASE {database};",
+        f"USE {database};"
+    ]
+
+# detalle_orden lleva la fecha de su orden (y el mes) para filtrar por rango de fechas sin
+# unirse a orden. {llave} es la llave primaria y {particiones} el particionado opcional.
+DETAIL_DDL = """
+    CREATE TABLE detalle_orden (
+        id INT NOT NULL AUTO_INCREMENT,
+        linea_orden INT NOT NULL,
+        cantidad INT NOT NULL,
+        producto_id INT NOT NULL,
+        vendedor_id INT NOT NULL,
+        orden_id INT NOT NULL,
+        fecha DATE NOT NULL,
+        mes TINYINT AS (MONTH(fecha)) STORED,
+        {monto},
+        PRIMARY KEY ({llave})
+    ){particiones};
+    """.replace('{monto}', aggregates.LINE_AMOUNT_DDL)
+
+# Primer año con particion propia; las fechas anteriores van a la particion p_anterior
+PARTITION_FIRST_YEAR = 2000
+
+# Tablas particionadas por fecha. MySQL no permite llaves foraneas en una tabla particionada,
+# asi que las de detalle_orden no se crean y se validan al terminar cada carga.
+PARTITIONED_TABLES = ['detalle_orden']
+
+# Particiones por año de fecha, del primer año al siguiente al actual, mas una para fechas futuras
+def partition_ddl(first_year=PARTITION_FIRST_YEAR, last_year=None):
+    last_year = last_year or date.today().year + 1
+    partitions = [f"PARTITION p_anterior VALUES LESS THAN ('{first_year}-01-01')"] + [
+        f"PARTITION p{year} VALUES LESS THAN ('{year + 1}-01-01')" for year in range(first_year, last_year + 1)
+    ] + ["PARTITION p_futuro VALUES LESS THAN (MAXVALUE)"]
+    return "\n    PARTITION BY RANGE COLUMNS (fecha) (\n        " + ',\n        '.join(partitions) + "\n    )"
+
+# detalle_orden particionada por año. La columna de particion debe ser parte de la llave primaria.
+def partitioned_detail_ddl():
+    return DETAIL_DDL.format(llave='id, fecha', particiones=partition_ddl())
+
+MODEL_DDL = [
+    """
+    CREATE TABLE categoria (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        nombre VARCHAR (255) NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE producto (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        nombre VARCHAR (255) NOT NULL,
+        precio DECIMAL (10, 2) NOT NULL,
+        categoria_id INT NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE pais (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        nombre VARCHAR (255) NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE cliente (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        nombre VARCHAR (255) NOT NULL,
+        apellido VARCHAR (255) NOT NULL,
+        direccion VARCHAR (255) NOT NULL,
+        telefono VARCHAR (255) NOT NULL,
+        tarjeta_credito VARCHAR (255) NOT NULL,
+        edad INT NOT NULL,
+        salario DECIMAL (10,2) NOT NULL,
+        genero VARCHAR (255) NOT NULL,
+        pais_id INT NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE vendedor (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        nombre VARCHAR (255) NOT NULL,
+        pais_id INT NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE orden (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        fecha DATE NOT NULL,
+        mes TINYINT AS (MONTH(fecha)) STORED,
+        cliente_id INT NOT NULL
+    );
+    """,
+    DETAIL_DDL.format(llave='id', particiones='')
+]
+
+# Llaves foraneas del modelo: tabla, columna y tabla referenciada (por su id)
+FOREIGN_KEYS = [
+    ('producto', 'categoria_id', 'categoria'),
+    ('cliente', 'pais_id', 'pais'),
+    ('vendedor', 'pais_id', 'pais'),
+    ('orden', 'cliente_id', 'cliente'),
+    ('detalle_orden', 'producto_id', 'producto'),
+    ('detalle_orden', 'vendedor_id', 'vendedor'),
+    ('detalle_orden', 'orden_id', 'orden')
+]
+
+# Agregar las llaves foraneas indicadas, un solo ALTER TABLE por tabla
+def foreign_key_ddl(keys):
+    clauses = {}
+    for table, column, parent in keys:
+        clauses.setdefault(table, []).append(
+            f"ADD CONSTRAINT fk_{table}_{column} FOREIGN KEY ({column}) REFERENCES {parent}(id)"
+        )
+    return [f"ALTER TABLE {table} {', '.join(items)};" for table, items in clauses.items()]
+
+# Nombre del indice de una sentencia CREATE INDEX
+def index_name(ddl):
+    return ddl.split()[2]
+
+# Tablas de resumen y del modelo en orden de eliminacion
+def all_tables():
+    return aggregates.SUMMARY_TABLES + list(reversed(MODEL_TABLES))
+
+# Llaves foraneas que se pueden crear, sin las de las tablas particionadas
+def declared_keys(keys, partitioned):
+    return [key for key in keys if key[0] not in partitioned]
+
+# Sentencias para crear el modelo completo. Con defer no se crean las llaves foraneas ni
+# los indices secundarios del modelo; finish_model los agrega despues de la carga.
+# Con partition detalle_orden se particiona por año de fecha (solo MySQL).
+# Los motores embebidos no tienen base de datos aparte: se reemplazan sus tablas.
+def create_model_ddl(defer=False, dialect=backends.MYSQL, partition=False, database=DEFAULT_DATABASE):
+    if dialect == backends.MYSQL:
+        model = MODEL_DDL
+        partitioned = []
+        if partition:
+            model = [ddl for ddl in MODEL_DDL if 'CREATE TABLE detalle_orden' not in ddl] + [partitioned_detail_ddl()]
+            partitioned = PARTITIONED_TABLES
+        statements = database_ddl(database) + model + aggregates.SUMMARY_DDL
+        if not defer:
+            statements = statements + foreign_key_ddl(declared_keys(FOREIGN_KEYS, partitioned)) + advisor.INDEX_DDL
+        return statements
+    if partition:
+        raise ValueError("El particionado solo esta disponible con MySQL")
+    statements = [f"DROP TABLE IF EXISTS {table};" for table in all_tables()]
+    statements += [backends.translate_ddl(statement, dialect) for statement in MODEL_DDL + aggregates.SUMMARY_DDL]
+    if not defer:
+        statements += advisor.INDEX_DDL
+    return statements
+
+# Eliminar todas las tablas en una sola sentencia por grupo, sin revisar las llaves foraneas
+def drop_model_ddl(dialect=backends.MYSQL):
+    if dialect != backends.MYSQL:
+        return [f"DROP TABLE {table};" for table in all_tables()]
+    return [
+        "SET FOREIGN_KEY_CHECKS = 0;",
+        f"DROP TABLE IF EXISTS {', '.join(aggregates.SUMMARY_TABLES)};",
+        f"DROP TABLE {', '.join(reversed(MODEL_TABLES))};",
+        "SET FOREIGN_KEY_CHECKS = 1;"
+    ]
+
+# Vaciar todas las tablas con TRUNCATE, que recrea cada tabla en lugar de borrar fila por fila.
+# TRUNCATE no se puede hacer sobre una tabla referenciada si las llaves foraneas estan activas.
+# SQLite no tiene TRUNCATE; su DELETE sin WHERE vacia la tabla sin recorrerla.
+def truncate_model_ddl(dialect=backends.MYSQL):
+    if dialect != backends.MYSQL:
+        return [f"DELETE FROM {table};" for table in all_tables()]
+    return ["SET FOREIGN_KEY_CHECKS = 0;"] + [
+        f"TRUNCATE TABLE {table};" for table in all_tables()
+    ] + ["SET FOREIGN_KEY_CHECKS = 1;"]
+
+# Ejecutar varias sentencias en un solo viaje al servidor. La conexion debe abrirse con
+# CLIENT.MULTI_STATEMENTS; se leen todos los resultados para detectar el primer error.
+# En los motores embebidos no hay viajes al servidor y se ejecutan una por una.
+def run_script(connection, statements):
+    with connection.cursor() as cursor:
+        if backends.dialect_of(connection) == backends.MYSQL:
+            cursor.execute('\n'.join(statement.strip() for statement in statements))
+            while cursor.nextset():
+                pass
+        else:
+            for statement in statements:
+                cursor.execute(statement)
+    connection.commit()
+
+# Filas de table cuyo column no existe en parent
+def count_orphans(cursor, table, column, parent):
+    cursor.execute(
+        f"SELECT COUNT(*) AS huerfanos FROM {table} LEFT JOIN {parent} ON {table}.{column} = {parent}.id WHERE {parent}.id IS NULL;"
+    )
+    return cursor.fetchone()['huerfanos']
+
+# Indices existentes en la base de datos de la conexion
+EXISTING_INDEXES = {
+    backends.MYSQL: "SELECT DISTINCT index_name AS nombre FROM information_schema.statistics WHERE table_schema = DATABASE();",
+    backends.SQLITE: "SELECT name AS nombre FROM sqlite_master WHERE type = 'index';",
+    backends.DUCKDB: "SELECT index_name AS nombre FROM duckdb_indexes();"
+}
+
+# Crear las llaves foraneas y los indices que falten (los diferidos por create_model_ddl).
+# Antes de crear cada llave se valida que no haya filas huerfanas; como ya estan validadas
+# se agregan con FOREIGN_KEY_CHECKS = 0, lo que permite crearlas sin copiar la tabla.
+# Los motores embebidos y las tablas particionadas no tienen llaves foraneas: en ellos se
+# validan en cada carga.
+def finish_model(connection):
+    start = time.perf_counter()
+    dialect = backends.dialect_of(connection)
+    partitioned = []
+    with connection.cursor() as cursor:
+        if dialect == backends.MYSQL:
+            cursor.execute("""
+            SELECT table_name AS tabla, column_name AS columna
+            FROM information_schema.key_column_usage
+            WHERE table_schema = DATABASE() AND referenced_table_name IS NOT NULL;
+            """)
+            existing_keys = {(row['tabla'], row['columna']) for row in cursor.fetchall()}
+            keys = [key for key in FOREIGN_KEYS if (key[0], key[1]) not in existing_keys]
+            cursor.execute("""
+            SELECT DISTINCT table_name AS tabla
+            FROM information_schema.partitions
+            WHERE table_schema = DATABASE() AND partition_name IS NOT NULL;
+            """)
+            partitioned = [row['tabla'] for row in cursor.fetchall()]
+        else:
+            keys = FOREIGN_KEYS
+        cursor.execute(EXISTING_INDEXES[dialect])
+        existing_indexes = {row['nombre'] for row in cursor.fetchall()}
+        indexes = [ddl for ddl in advisor.INDEX_DDL if index_name(ddl) not in existing_indexes]
+        orphans = []
+        for table, column, parent in keys:
+            count = count_orphans(cursor, table, column, parent)
+            if count:
+                orphans.append(f"{table}.{column}: {count}")
+        if orphans:
+            raise ValueError(f"Filas sin referencia valida, no se crearon las llaves foraneas: {', '.join(orphans)}")
+        if dialect == backends.MYSQL:
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 0;")
+            try:
+                for statement in foreign_key_ddl(declared_keys(keys, partitioned)):
+                    cursor.execute(statement)
+            finally:
+                cursor.execute("SET FOREIGN_KEY_CHECKS = 1;")
+        for statement in indexes:
+            cursor.execute(statement)
+    connection.commit()
+    return {
+        'llaves_foraneas': [f"{table}.{column}" for table, column, _ in declared_keys(keys, partitioned)] if dialect == backends.MYSQL else [],
+        'llaves_validadas': [f"{table}.{column}" for table, column, _ in keys],
+        'indices': [index_name(ddl) for ddl in indexes],
+        'segundos': round(time.perf_counter() - start, 3)
+    }
@@ -0,0 +1,18 @@
+import os
+
+# Motor de base de datos: mysql (por defecto), sqlite o duckdb. Los dos ultimos se ejecutan
+# dentro del proceso y guardan el modelo en el archivo EMPRESA_ARCHIVO_BD.
+BACKEND = os.environ.get('EMPRESA_MOTOR_BD', 'mysql')
+EMBEDDED_PATH = os.environ.get('EMPRESA_ARCHIVO_BD', 'Proyecto1/empresa.db')
+
+# Datos de conexion a la base de datos en MySQL, compartidos por la API y el modo asincrono
+DB_SETTINGS = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': 'admin123',
+    'database': 'empresa'
+}
+
+# Segundos a partir de los que una sentencia SQL se registra como lenta, con su EXPLAIN.
+# Se configura con la variable de entorno EMPRESA_CONSULTA_LENTA; sin ella el registro esta apagado.
+SLOW_QUERY_SECONDS = float(os.environ['EMPRESA_CONSULTA_LENTA']) if os.environ.get('EMPRESA_CONSULTA_LENTA') else None
@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+import sys
+import numpy
+import pandas
+import loader
+
+# Instantaneas del modelo: cada columna de cada tabla se guarda como un arreglo .npy, que se
+# vuelve a abrir con mmap sin parsear texto. Sirven para reiniciar el entorno en segundos en
+# lugar de volver a leer los CSV.
+
+# Carpeta donde se guardan las instantaneas, una subcarpeta por nombre
+SNAPSHOT_DIR = 'Proyecto1/instantaneas'
+DEFAULT_SNAPSHOT = 'modelo'
+
+# Archivo con la descripcion de las tablas de una instantanea
+MANIFEST_FILE = 'manifiesto.json'
+SNAPSHOT_VERSION = 1
+
+# Columnas normalizadas de cada tabla del modelo, en orden de carga. Las columnas mes y
+# detalle_orden.monto se calculan en la base de datos y detalle_orden.fecha al abrir la
+# instantanea (es la fecha de su orden), por eso no se guardan.
+SNAPSHOT_COLUMNS = {table: list(columns.values()) for table, _, columns in loader.SIMPLE_TABLES}
+SNAPSHOT_COLUMNS['orden'] = ['id', 'fecha', 'cliente_id']
+SNAPSHOT_COLUMNS['detalle_orden'] = ['id', 'linea_orden', 'cantidad', 'producto_id', 'vendedor_id', 'orden_id']
+
+# Columnas de fecha, guardadas como datetime64[D]
+DATE_COLUMNS = {('orden', 'fecha')}
+
+# Carpeta de una instantanea; el nombre no puede salir de SNAPSHOT_DIR
+def snapshot_path(name):
+    if not name or os.path.basename(name) != name or name.startswith('.'):
+        raise ValueError(f"Nombre de instantanea invalido: {name}")
+    return os.path.join(SNAPSHOT_DIR, name)
+
+# Convertir una columna a un arreglo de NumPy de tipo fijo, que se pueda abrir con mmap
+def column_array(table, column, values):
+    if (table, column) in DATE_COLUMNS:
+        return pandas.to_datetime(values).to_numpy().astype('datetime64[D]')
+    if pandas.api.types.is_numeric_dtype(values.dtype):
+        return values.to_numpy()
+    # Texto (y Decimal de MySQL) como cadenas de ancho fijo
+    if len(values) and not isinstance(values.iloc[0], str):
+        return values.astype(numpy.float64).to_numpy()
+    return values.astype(str).to_numpy().astype(str)
+
+# Escribir las tablas {tabla: DataFrame} como instantanea. Se escribe en una carpeta temporal
+# y se renombra al final, asi una instantanea a medio escribir nunca reemplaza a la anterior.
+def export_snapshot(tables, name=DEFAULT_SNAPSHOT):
+    path = snapshot_path(name)
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    manifest = {'version': SNAPSHOT_VERSION, 'tablas': {}}
+    for table, columns in SNAPSHOT_COLUMNS.items():
+        df = tables[table]
+        for column in columns:
+            array = column_array(table, column, df[column])
+            numpy.save(os.path.join(tmp_path, f"{table}.{column}.npy"), array, allow_pickle=False)
+        manifest['tablas'][table] = {'filas': len(df), 'columnas': columns}
+    with open(os.path.join(tmp_path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4)
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp_path, path)
+    return manifest
+
+# Abrir una instantanea y devolver {tabla: DataFrame}. Las columnas numericas y de fecha
+# se leen con mmap, sin copiar los datos a memoria hasta que se usan.
+def load_snapshot(name=DEFAULT_SNAPSHOT):
+    path = snapshot_path(name)
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise ValueError(f"No existe la instantanea: {name}")
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest['version'] != SNAPSHOT_VERSION:
+        raise ValueError(f"Version de instantanea no soportada: {manifest['version']}")
+    tables = {}
+    for table, entry in manifest['tablas'].items():
+        arrays = {
+            column: numpy.load(os.path.join(path, f"{table}.{column}.npy"), mmap_mode='r', allow_pickle=False)
+            for column in entry['columnas']
+        }
+        tables[table] = pandas.DataFrame(arrays, copy=False)
+    # detalle_orden.fecha no se guarda: es la fecha de su orden
+    orders = tables['orden']
+    details = tables['detalle_orden']
+    # Las ordenes no vienen necesariamente ordenadas por id (la exportacion desde los CSV las
+    # deja en el orden del archivo), asi que la fecha se busca por id
+    positions = pandas.Index(orders['id'].to_numpy()).get_indexer(details['orden_id'].to_numpy())
+    if len(positions) and positions.min() < 0:
+        raise ValueError("La instantanea tiene lineas de detalle_orden con ordenes que no existen")
+    details['fecha'] = orders['fecha'].to_numpy()[positions]
+    return tables
+
+# Leer las tablas normalizadas de la base de datos
+def tables_from_connection(connection):
+    tables = {}
+    with connection.cursor() as cursor:
+        for table, columns in SNAPSHOT_COLUMNS.items():
+            cursor.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY id;")
+            tables[table] = pandas.DataFrame(list(cursor.fetchall()), columns=columns)
+    return tables
+
+# Leer las tablas normalizadas directamente de los CSV, sin base de datos
+def tables_from_csv():
+    tables = {}
+    for table, file_name, columns in loader.SIMPLE_TABLES:
+        tables[table] = next(loader.read_chunks(file_name, columns))
+    df_order, df_detail = loader.OrderSplitter().split(next(loader.read_chunks(loader.ORDERS_FILE, loader.ORDERS_COLUMNS)))
+    tables['orden'] = df_order
+    tables['detalle_orden'] = df_detail
+    return tables
+
+# Uso por linea de comandos: python Proyecto1/snapshot.py [nombre]
+# Genera la instantanea a partir de los CSV.
+def main():
+    name = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_SNAPSHOT
+    manifest = export_snapshot(tables_from_csv(), name)
+    print(json.dumps(manifest, indent=4))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,320 @@
+import csv
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy
+import pandas
+import loader
+
+# Etapa de lectura y validacion de los CSV antes de la carga. Cada archivo se divide en rangos
+# de bytes que terminan en un salto de linea y se parsean en un pool de procesos; los tipos,
+# rangos, llaves repetidas y referencias a las dimensiones se revisan por columnas completas.
+# Las filas con errores se escriben en un archivo de rechazos y solo las limpias llegan a la
+# base de datos, asi un registro malo no obliga a repetir toda la carga.
+
+# Carpeta de los archivos de rechazos, uno por CSV con filas rechazadas
+REJECT_DIR = 'Proyecto1/rechazos'
+
+# Procesos por defecto para parsear los rangos
+DEFAULT_PROCESSES = os.cpu_count() or 1
+
+# Bytes minimos de un rango; un archivo pequeno no se divide
+MIN_RANGE_BYTES = 1 << 20
+
+NEWLINE = ord('\n')
+CARRIAGE_RETURN = ord('\r')
+SEPARATOR = ord(';')
+
+# Limites de los tipos de columna del modelo: INT, DECIMAL (10, 2) y VARCHAR (255)
+INT_LIMIT = 2 ** 31
+DECIMAL_LIMIT = 10 ** 8
+STRING_LIMIT = 255
+
+# Formato de las fechas de ordenes.csv
+DATE_FORMAT = '%d/%m/%Y'
+DATE_COLUMNS = {'fecha_orden'}
+
+# Valores minimos de las columnas numericas; los ids (id_*) deben ser mayores que cero
+MINIMUMS = {'Precio': 0, 'Salario': 0, 'Edad': 0, 'linea_orden': 1, 'cantidad': 1}
+
+# Llave de cada archivo, que no se puede repetir
+KEY_COLUMNS = {file_name: [next(iter(columns))] for _, file_name, columns in loader.SIMPLE_TABLES}
+KEY_COLUMNS[loader.ORDERS_FILE] = ['id_orden', 'linea_orden']
+
+# Columnas de cada archivo que referencian a una tabla del modelo por su id
+REFERENCES = {
+    'productos.csv': {'id_categoria': 'categoria'},
+    'clientes.csv': {'id_pais': 'pais'},
+    'vendedores.csv': {'id_pais': 'pais'},
+    loader.ORDERS_FILE: {'id_cliente': 'cliente', 'id_vendedor': 'vendedor', 'id_producto': 'producto'}
+}
+
+# Columnas del encabezado de la orden, iguales en todas sus lineas
+ORDER_HEADER_COLUMNS = ['fecha_orden', 'id_cliente']
+
+# Leer el encabezado de un CSV (sin BOM) y la posicion donde empiezan los datos
+def read_header(path):
+    with open(path, 'rb') as f:
+        header = f.readline()
+        return header.decode('utf-8-sig').rstrip('\r\n').split(';'), f.tell()
+
+# Dividir los datos de un archivo en rangos de bytes [inicio, fin) que empiezan al inicio de una linea
+def split_ranges(path, data_start, parts):
+    size = os.path.getsize(path)
+    parts = max(1, min(parts, (size - data_start) // MIN_RANGE_BYTES))
+    bounds = [data_start]
+    with open(path, 'rb') as f:
+        for index in range(1, parts):
+            # Avanzar hasta el siguiente salto de linea desde el byte anterior al corte
+            f.seek(data_start + (size - data_start) * index // parts - 1)
+            f.readline()
+            if bounds[-1] < f.tell() < size:
+                bounds.append(f.tell())
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+# Agregar motivo a las filas de bad que aun no tienen uno
+def add_reason(reasons, bad, reason):
+    bad = numpy.asarray(bad, dtype=bool) & (reasons == '')
+    reasons[bad] = reason
+
+# Revisar cada columna de df (texto) con el tipo de CSV_DTYPES. Devuelve el motivo de rechazo
+# de cada fila ('' si es valida) y las columnas convertidas a su tipo.
+def check_columns(df, file_name):
+    reasons = numpy.full(len(df), '', dtype=object)
+    typed = {}
+    for column, dtype in loader.CSV_DTYPES[file_name].items():
+        values = df[column]
+        if column in DATE_COLUMNS:
+            dates = pandas.to_datetime(values, format=DATE_FORMAT, errors='coerce')
+            add_reason(reasons, dates.isna(), f"{column}: fecha invalida")
+            typed[column] = values.astype('string')
+        elif dtype == 'string':
+            stripped = values.str.strip()
+            add_reason(reasons, stripped == '', f"{column}: vacio")
+            add_reason(reasons, values.str.contains('\ufffd', regex=False), f"{column}: codificacion invalida")
+            add_reason(reasons, values.str.len() > STRING_LIMIT, f"{column}: mas de {STRING_LIMIT} caracteres")
+            typed[column] = values.astype('string')
+        else:
+            numbers = pandas.to_numeric(values, errors='coerce')
+            minimum = 1 if column.startswith('id_') else MINIMUMS.get(column)
+            if dtype == 'int64':
+                add_reason(reasons, numbers.isna() | (numbers % 1 != 0), f"{column}: entero invalido")
+                add_reason(reasons, numbers.abs() >= INT_LIMIT, f"{column}: fuera de rango")
+            else:
+                add_reason(reasons, numbers.isna(), f"{column}: numero invalido")
+                add_reason(reasons, numbers.abs() >= DECIMAL_LIMIT, f"{column}: fuera de rango")
+            if minimum is not None:
+                add_reason(reasons, numbers < minimum, f"{column}: menor que {minimum}")
+            typed[column] = numbers
+    valid = reasons == ''
+    clean = pandas.DataFrame({
+        column: values[valid].astype(loader.CSV_DTYPES[file_name][column]).to_numpy() for column, values in typed.items()
+    })
+    return reasons, clean
+
+# Parsear y validar el rango [start, end) de un archivo en un proceso del pool. Devuelve las filas
+# validas con su tipo, las rechazadas (texto original y motivo) y la cantidad de lineas del rango.
+# Las lineas se numeran desde 1 dentro del rango; las vacias se ignoran pero se cuentan.
+def parse_range(path, start, end, file_name, names):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    raw = numpy.frombuffer(data, dtype=numpy.uint8)
+    # Inicio y fin (sin el salto) de cada linea; la ultima puede no tener salto
+    ends = numpy.flatnonzero(raw == NEWLINE)
+    if not len(ends) or ends[-1] != len(raw) - 1:
+        ends = numpy.append(ends, len(raw))
+    starts = numpy.concatenate(([0], ends[:-1] + 1))
+    # Separadores por linea a partir de la suma acumulada
+    separators = numpy.concatenate(([0], numpy.cumsum(raw == SEPARATOR)))
+    fields = separators[ends] - separators[starts] + 1
+    lengths = ends - starts
+    blank = (lengths == 0) | ((lengths == 1) & (raw[numpy.minimum(starts, len(raw) - 1)] == CARRIAGE_RETURN))
+    bad_shape = ~blank & (fields != len(names))
+    keep = ~blank & ~bad_shape
+    line_numbers = numpy.arange(1, len(ends) + 1)
+    if keep.all():
+        body = data
+    else:
+        # Quitar las lineas descartadas con una mascara por byte
+        line_of_byte = numpy.repeat(numpy.arange(len(ends)), lengths + 1)[:len(raw)]
+        body = raw[keep[line_of_byte]].tobytes()
+    if keep.any():
+        # Sin comillas: cada ; separa un campo, igual que en la cuenta de columnas
+        df = pandas.read_csv(
+            io.BytesIO(body), sep=';', header=None, names=names, dtype=str, keep_default_na=False,
+            na_filter=False, quoting=csv.QUOTE_NONE, encoding='utf-8', encoding_errors='replace'
+        )
+    else:
+        df = pandas.DataFrame({name: pandas.Series(dtype=str) for name in names})
+    reasons, clean = check_columns(df, file_name)
+    valid = reasons == ''
+    clean['_linea'] = line_numbers[keep][valid]
+    rejected = df[~valid]
+    rejects = pandas.DataFrame({
+        'linea': numpy.concatenate((line_numbers[keep][~valid], line_numbers[bad_shape])),
+        'contenido': (rejected.agg(';'.join, axis=1).tolist() if len(rejected) else []) + [
+            data[first:last].decode('utf-8', 'replace').rstrip('\r') for first, last in zip(starts[bad_shape], ends[bad_shape])
+        ],
+        'motivo': list(reasons[~valid]) + ['cantidad de columnas invalida'] * int(bad_shape.sum())
+    })
+    return clean, rejects, len(ends)
+
+# Filas validas vacias de un archivo, con sus tipos
+def empty_frame(file_name):
+    frame = pandas.DataFrame({column: pandas.Series(dtype=dtype) for column, dtype in loader.CSV_DTYPES[file_name].items()})
+    frame['_linea'] = pandas.Series(dtype='int64')
+    return frame
+
+# Filas rechazadas vacias, para los archivos sin filas
+def empty_rejects():
+    return pandas.DataFrame({'linea': pandas.Series(dtype='int64'), 'contenido': pandas.Series(dtype=str), 'motivo': pandas.Series(dtype=str)})
+
+# Texto de las lineas indicadas (numeradas desde 1, con el encabezado) de un archivo
+def read_lines(path, numbers):
+    data = numpy.fromfile(path, dtype=numpy.uint8)
+    ends = numpy.flatnonzero(data == NEWLINE)
+    if not len(ends) or ends[-1] != len(data) - 1:
+        ends = numpy.append(ends, len(data))
+    starts = numpy.concatenate(([0], ends[:-1] + 1))
+    index = numpy.asarray(numbers, dtype=numpy.int64) - 1
+    return [data[first:last].tobytes().decode('utf-8', 'replace').rstrip('\r') for first, last in zip(starts[index], ends[index])]
+
+# Revisar un archivo completo: llaves repetidas, referencias a las dimensiones ya validadas
+# (ids) y, en ordenes.csv, que cada orden llegue completa y con un solo encabezado. Las filas
+# que se rechazan aqui se agregan a rejects con el texto original de su linea.
+def check_file(path, file_name, clean, rejects, ids):
+    moved = []
+
+    def reject(bad, reason):
+        nonlocal clean
+        bad = numpy.asarray(bad, dtype=bool)
+        if bad.any():
+            moved.append(clean[bad].assign(motivo=reason))
+            clean = clean[~bad]
+
+    keys = KEY_COLUMNS[file_name]
+    reject(clean.duplicated(keys), f"{', '.join(keys)}: repetido")
+    for column, parent in REFERENCES.get(file_name, {}).items():
+        reject(~clean[column].isin(ids[parent]), f"{column}: no existe en {parent}")
+    if file_name == loader.ORDERS_FILE:
+        headers = clean.groupby('id_orden')[ORDER_HEADER_COLUMNS].nunique()
+        reject(clean['id_orden'].isin(headers.index[(headers > 1).any(axis=1)]), "orden con fecha o cliente distintos entre lineas")
+        # Una orden con alguna linea rechazada se rechaza completa
+        parsed = pandas.concat(rejects, ignore_index=True)['contenido'].astype(str).str.split(';').str[0]
+        broken = pandas.concat(
+            [pandas.to_numeric(parsed, errors='coerce').dropna()] + [rows['id_orden'] for rows in moved], ignore_index=True
+        )
+        reject(clean['id_orden'].isin(broken), "orden con lineas rechazadas")
+    if moved:
+        moved = pandas.concat(moved, ignore_index=True)
+        rejects = rejects + [pandas.DataFrame({
+            'linea': moved['_linea'].to_numpy(),
+            'contenido': read_lines(path, moved['_linea']),
+            'motivo': moved['motivo'].to_numpy()
+        })]
+    return clean, pandas.concat(rejects, ignore_index=True).sort_values('linea', kind='stable')
+
+# Ruta del archivo de rechazos de un CSV
+def reject_path(file_name, reject_dir=REJECT_DIR):
+    return os.path.join(reject_dir, os.path.splitext(file_name)[0] + '_rechazos.csv')
+
+# Escribir las filas rechazadas con el encabezado original mas la linea y el motivo; las filas
+# conservan su formato para poder corregirlas y enviarlas a /cargarincremental
+def write_rejects(file_name, names, rejects, reject_dir=REJECT_DIR):
+    path = reject_path(file_name, reject_dir)
+    os.makedirs(reject_dir, exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(';'.join(names + ['linea', 'motivo']) + '\n')
+        for content, line, reason in zip(rejects['contenido'], rejects['linea'], rejects['motivo']):
+            f.write(f"{content};{line};{reason}\n")
+    return path
+
+# Parsear y validar los CSV del modelo. Devuelve las tablas normalizadas {tabla: DataFrame}
+# listas para loader.load_tables y un resumen de cada archivo con sus filas rechazadas.
+def stage_model(data_dir=None, processes=DEFAULT_PROCESSES, reject_dir=REJECT_DIR):
+    if processes < 1:
+        raise ValueError("La cantidad de procesos debe ser mayor que cero")
+    start = time.perf_counter()
+    data_dir = data_dir or loader.DATA_DIR
+    # ordenes.csv no tiene una tabla propia: se separa en orden y detalle_orden
+    files = loader.SIMPLE_TABLES + [(None, loader.ORDERS_FILE, loader.ORDERS_COLUMNS)]
+    jobs = {}
+    headers = {}
+    for _, file_name, _ in files:
+        path = os.path.join(data_dir, file_name)
+        names, data_start = read_header(path)
+        missing = [column for column in loader.CSV_DTYPES[file_name] if column not in names]
+        if missing:
+            raise ValueError(f"Columnas faltantes en {file_name}: {', '.join(missing)}")
+        headers[file_name] = names
+        jobs[file_name] = [(path, first, last, file_name, names) for first, last in split_ranges(path, data_start, processes)]
+    # Todos los rangos de todos los archivos en el mismo pool
+    if processes == 1:
+        results = {file_name: [parse_range(*job) for job in file_jobs] for file_name, file_jobs in jobs.items()}
+    else:
+        # Procesos nuevos (spawn) y no copias del proceso de la API (fork): una copia heredaria
+        # los sockets del pool de conexiones y los candados que otros hilos tengan tomados
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {file_name: [executor.submit(parse_range, *job) for job in file_jobs] for file_name, file_jobs in jobs.items()}
+            results = {file_name: [future.result() for future in file_futures] for file_name, file_futures in futures.items()}
+    tables = {}
+    ids = {}
+    summary = []
+    for table, file_name, columns in files:
+        # Numerar las lineas del archivo: el encabezado es la linea 1
+        offset = 1
+        cleans = [empty_frame(file_name)]
+        rejects = [empty_rejects()]
+        for clean, rejected, lines in results[file_name]:
+            cleans.append(clean.assign(_linea=clean['_linea'] + offset))
+            rejects.append(rejected.assign(linea=rejected['linea'] + offset))
+            offset += lines
+        path = os.path.join(data_dir, file_name)
+        clean, rejected = check_file(path, file_name, pandas.concat(cleans, ignore_index=True), rejects, ids)
+        path = reject_path(file_name, reject_dir)
+        if len(rejected):
+            path = write_rejects(file_name, headers[file_name], rejected, reject_dir)
+        else:
+            # No dejar los rechazos de una carga anterior
+            if os.path.exists(path):
+                os.remove(path)
+            path = None
+        df = clean.drop(columns='_linea').rename(columns=columns).reset_index(drop=True)
+        if table is not None:
+            tables[table] = df
+            ids[table] = df['id']
+        else:
+            tables['orden'], tables['detalle_orden'] = loader.OrderSplitter().split(df)
+        summary.append({
+            'archivo': file_name,
+            'rangos': len(jobs[file_name]),
+            'filas': len(clean) + len(rejected),
+            'validas': len(clean),
+            'rechazadas': len(rejected),
+            'motivos': {reason: int(count) for reason, count in rejected['motivo'].value_counts().items()},
+            'rechazos': path
+        })
+    report = {
+        'archivos': summary,
+        'rechazadas': sum(entry['rechazadas'] for entry in summary),
+        'procesos': processes,
+        'segundos': round(time.perf_counter() - start, 3)
+    }
+    return tables, report
+
+# Validar los CSV sin cargarlos: python Proyecto1/staging.py [carpeta] [procesos]
+def main():
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else loader.DATA_DIR
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PROCESSES
+    _, report = stage_model(data_dir, processes)
+    print(json.dumps(report, indent=4))
+    return 1 if report['rechazadas'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())